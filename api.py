@@ -0,0 +1,204 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import hashlib
+import json
+
+from flask import Blueprint, Response, request
+
+import queries
+from cache import cache, cache_key
+from forms import state_options
+from models import Venue, Artist
+from routing import read_only
+
+try:
+    import orjson
+except ImportError:  # in requirements.txt; json stands in without it
+    orjson = None
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+#----------------------------------------------------------------------------#
+# Serialization.
+#----------------------------------------------------------------------------#
+
+
+def _default(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(repr(value))
+
+
+def dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data, default=_default)
+    return json.dumps(data, separators=(',', ':'), default=_default).encode()
+
+
+def parse_fields(fields):
+    """Turn ?fields=a,b.c,b.d into the tree {'a': {}, 'b': {'c': {}, 'd': {}}}."""
+    tree = {}
+    for path in fields.split(','):
+        node = tree
+        for key in filter(None, path.strip().split('.')):
+            node = node.setdefault(key, {})
+    return tree
+
+
+def select_fields(data, fields):
+    """Keep only the keys in the `fields` tree, of an object or of each item.
+
+    A key with no children in the tree keeps its whole value; one with
+    children narrows the object, or each object of the list, below it:
+    shows.venue_name,next_cursor on /shows.
+    """
+    if isinstance(data, list):
+        return [select_fields(item, fields) for item in data]
+    if not isinstance(data, dict):
+        return data
+    return {
+        key: select_fields(data[key], children) if children else data[key]
+        for key, children in fields.items() if key in data
+    }
+
+
+def respond(data, status=200):
+    """Serialize `data`, honouring ?fields= and If-None-Match."""
+    fields = request.args.get('fields')
+    if fields and status == 200:
+        data = select_fields(data, parse_fields(fields))
+
+    body = dumps(data)
+    response = Response(body, status=status, mimetype='application/json')
+    if status == 200:
+        response.set_etag(hashlib.sha1(body).hexdigest())
+        response.make_conditional(request)
+    return response
+
+
+def not_found(message):
+    return respond({"error": message}, status=404)
+
+#----------------------------------------------------------------------------#
+# Endpoints.
+#----------------------------------------------------------------------------#
+
+#  Venues
+#  ----------------------------------------------------------------
+
+@api.route('/venues')
+@read_only
+def venues():
+    genres = request.args.getlist('genre')
+    if genres:
+        return respond(queries.venue_areas(genres, request.args.get('match', 'all')))
+    return respond(cache.get_or_set(
+        cache_key('venues', stamp=_stamp(queries.listing_stamp(Venue))), queries.venue_areas))
+
+
+@api.route('/venues/<int:venue_id>')
+@read_only
+def venue(venue_id):
+    data = _detail('show_venue', Venue, queries.venue_detail, venue_id)
+    return not_found('Venue does not exist') if data is None else respond(data)
+
+
+def venue_calendar_days(venue, first, last):
+    """queries.venue_calendar for the API and the HTML calendar page."""
+    # Whole months are cached, keyed on the venue's updated_at: booking or
+    # removing a show there, or touch() from an artist edit, bumps it.
+    month = queries.calendar_month(first, last)
+    if month is None:
+        return queries.venue_calendar(venue.id, first, last)
+    return cache.get_or_set(
+        cache_key('venue_calendar', '{}:{}:{:.6f}'.format(
+            venue.id, month, venue.updated_at.timestamp())),
+        lambda: queries.venue_calendar(venue.id, first, last))
+
+
+@api.route('/venues/<int:venue_id>/calendar')
+@read_only
+def venue_calendar(venue_id):
+    venue = Venue.query.get(venue_id)
+    if venue is None:
+        return not_found('Venue does not exist')
+    try:
+        first, last = queries.calendar_range(request.args.get('from'), request.args.get('to'))
+    except ValueError:
+        return respond({"error": "from and to must be ISO dates at most {} days apart"
+                        .format(queries.MAX_CALENDAR_DAYS - 1)}, status=400)
+
+    days = venue_calendar_days(venue, first, last)
+    booked = sum(day['booked'] for day in days)
+    return respond({"venue_id": venue.id, "from": first, "to": last,
+                    "booked_days": booked, "free_days": len(days) - booked, "days": days})
+
+#  Artists
+#  ----------------------------------------------------------------
+
+@api.route('/artists')
+@read_only
+def artists():
+    genres = request.args.getlist('genre')
+    if genres:
+        return respond(queries.artist_listing(genres, request.args.get('match', 'all')))
+    return respond(cache.get_or_set(
+        cache_key('artists', stamp=_stamp(queries.listing_stamp(Artist))), queries.artist_listing))
+
+
+@api.route('/artists/<int:artist_id>')
+@read_only
+def artist(artist_id):
+    data = _detail('show_artist', Artist, queries.artist_detail, artist_id)
+    return not_found('Artist does not exist') if data is None else respond(data)
+
+
+def _stamp(validators):
+    # Keyed like the HTML pages' entries, so the two share them.
+    return None if validators is None else validators[1]
+
+
+def _detail(endpoint, model, builder, entity_id):
+    past_page = request.args.get('past_page', 1, type=int)
+    upcoming_page = request.args.get('upcoming_page', 1, type=int)
+    if past_page == upcoming_page == 1:
+        stamp = _stamp(queries.entity_stamp(model, entity_id))
+        if stamp is None:
+            return None
+        return cache.get_or_set(cache_key(endpoint, entity_id, stamp),
+                                lambda: builder(entity_id))
+    return builder(entity_id, past_page=past_page, upcoming_page=upcoming_page)
+
+#  Shows
+#  ----------------------------------------------------------------
+
+@api.route('/shows')
+@read_only
+def shows():
+    after = request.args.get('after')
+    if after:
+        try:
+            after = queries.decode_cursor(after)
+        except ValueError:
+            return respond({"error": "Invalid cursor"}, status=400)
+    return respond(queries.show_page(after or None))
+
+#  Search
+#  ----------------------------------------------------------------
+
+@api.route('/search')
+@read_only
+def search():
+    kind = request.args.get('type', 'venues')
+    if kind == 'location':
+        location = queries.parse_location(
+            request.args.get('q', ''), [state for state, _ in state_options])
+        if location is None:
+            return respond({"error": "q must look like 'City, ST'"}, status=400)
+        return respond(queries.location_search(*location))
+
+    model = {'venues': Venue, 'artists': Artist}.get(kind)
+    if model is None:
+        return respond({"error": "type must be 'venues', 'artists' or 'location'"}, status=400)
+    return respond(queries.search(model, request.args.get('q', '')))
@@ -4,8 +4,10 @@
 
 
 import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+import babel.dates
+from functools import lru_cache, wraps
+from operator import itemgetter
+from flask import Flask, render_template, stream_template, request, Response, flash, redirect, url_for, abort, jsonify, stream_with_context, session, make_response, g
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
 import logging
@@ -13,10 +15,24 @@ from logging import Formatter, FileHandler
 from flask_wtf import Form
 from forms import *
 from flask_migrate import Migrate
-from sqlalchemy import desc
+from sqlalchemy.exc import IntegrityError
 import pytz
 # import datetime
-from models import Venue, Artist, Show, db, datetime
+from datetime import timedelta
+from models import Venue, Artist, Show, Availability, db, datetime, DEFAULT_SHOW_MINUTES
+import config
+import dbpool
+import metrics
+import partitions
+import queries
+import querystats
+import counters
+import exporter
+from api import api, venue_calendar_days
+from commands import counters_cli, shows_cli, import_command, export_command
+from cache import cache, cache_key
+from autocomplete import autocomplete
+from routing import read_only
 
 #----------------------------------------------------------------------------#
 # App Config.
@@ -25,158 +41,254 @@ from models import Venue, Artist, Show, db, datetime
 utc = pytz.UTC
 app = Flask(__name__)
 moment = Moment(app)
-app.config.from_object('config')
+app.config.from_object(config.get_config())
 db.init_app(app)
+cache.init_app(app)
+querystats.init_app(app)
+metrics.init_app(app)
+autocomplete.init_app(app)
 
 migrate = Migrate(app, db)
+app.cli.add_command(counters_cli)
+app.cli.add_command(shows_cli)
+app.cli.add_command(import_command)
+app.cli.add_command(export_command)
+app.register_blueprint(api)
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
 
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
+DATETIME_LOCALE = babel.Locale.parse('en')
+
+
+@lru_cache(maxsize=None)
+def datetime_pattern(format):
     if format == 'full':
         format = "EEEE MMMM, d, y 'at' h:mma"
     elif format == 'medium':
         format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format, locale='en')
+    return babel.dates.parse_pattern(format)
+
+
+def format_datetime(value, format='medium'):
+    # Views pass datetime objects; strings are still accepted but parsed.
+    if isinstance(value, str):
+        value = dateutil.parser.parse(value)
+    return datetime_pattern(format).apply(value, DATETIME_LOCALE)
 
 
 app.jinja_env.filters['datetime'] = format_datetime
 
+#----------------------------------------------------------------------------#
+# Conditional GET.
+#----------------------------------------------------------------------------#
+
+
+def revalidate(stamp):
+    """Answer If-None-Match/If-Modified-Since before running the view.
+
+    `stamp(**view_args)` returns (last_modified, etag) or None; it must be a
+    single cheap query, since it runs on every request. The etag is left in
+    g.stamp for the view to key its cached data on, so a page is never
+    built from data older than the ETag it goes out with.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            validators = stamp(**kwargs)
+            g.stamp = None if validators is None else validators[1]
+            # A pending flash message has to reach the rendered page.
+            if validators is None or '_flashes' in session:
+                return view(*args, **kwargs)
+
+            last_modified, etag = validators
+            probe = Response()
+            probe.set_etag(etag)
+            probe.last_modified = last_modified
+            probe.cache_control.no_cache = True
+            probe.make_conditional(request)
+            if probe.status_code == 304:
+                return probe
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+                response.last_modified = last_modified
+                response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
 
 @app.route('/')
+@read_only
 def index():
-    return render_template('pages/home.html')
+    # Kept warm by the create handlers, which push new listings in.
+    recent_venues = cache.get_or_set(
+        cache_key('recent_venues'), lambda: queries.recent(Venue))
+    recent_artists = cache.get_or_set(
+        cache_key('recent_artists'), lambda: queries.recent(Artist))
+
+    return render_template('pages/home.html', recent_venues=recent_venues, recent_artists=recent_artists)
 
 
 #  Venues
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@read_only
+@revalidate(lambda: queries.listing_stamp(Venue))
 def venues():
-    data = []
-    unique_venues = [
-        venue
-        for venue in db.session.query(Venue)
-        .distinct(Venue.state, Venue.city).all()
-    ]
-
-    for venue in unique_venues:
-        data.append(
-            {
-                "city": venue.city,
-                "state": venue.state,
-                "venues": [
-                    {
-                        "id": next_venue.id,
-                        "name": next_venue.name,
-                        "num_upcoming_show": db.session.query(Show)
-                        .filter(
-                            Show.start_time
-                            > datetime.today().strftime("%Y-%m-%dT%H:%M:%S")
-                        )
-                        .count(),
-                    }
-                    for next_venue in db.session.query(Venue).filter(
-                        Venue.state == venue.state, Venue.city == venue.city
-                    )
-                ],
-            }
-        )
+    genres = request.args.getlist('genre')
+
+    # Only the unfiltered listing is cached; genre filters hit the GIN index.
+    if genres:
+        data = queries.venue_areas(genres, request.args.get('match', 'all'))
+    else:
+        data = cache.get_or_set(cache_key('venues', stamp=g.stamp), queries.venue_areas)
+    facets = cache.get_or_set(
+        cache_key('venue_genres', stamp=g.stamp),
+        lambda: queries.genre_counts(Venue, [genre for genre, _ in genre_options]))
 
-    return render_template('pages/venues.html', areas=data)
+    return render_template('pages/venues.html', areas=data, facets=facets, selected=genres)
 
 #  Search Venue
 #  ----------------------------------------------------------------
 
 
 @app.route('/venues/search', methods=['POST'])
+@read_only
 def search_venues():
-    venues = (
-        db.session.query(Venue)
-        .filter(Venue.name.ilike(f"%{request.form.get('search_term')}%"))
-        .all()
-    )
+    search_term = request.form.get('search_term', '')
+    location = queries.parse_location(search_term, [state for state, _ in state_options])
+    if location is not None:
+        return render_template('pages/search_location.html', results=queries.location_search(*location), search_term=search_term)
+
+    response = queries.search(Venue, search_term)
+
+    return render_template('pages/search_venues.html', results=response, search_term=search_term)
 
-    response = {
-        "count": len(venues),
-        "data": [
-            {
-                "id": venue.id,
-                "name": venue.name,
-                "num_upcoming_shows": db.session.query(Show)
-                .filter(
-                    Show.start_time
-                    > datetime.today().strftime("%Y-%m-%d %H:%M:%S")
-                )
-                .count(),
-            }
-            for venue in venues
-        ],
-    }
-
-    return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
+#  Autocomplete
+#  ----------------------------------------------------------------
+
+
+@app.route('/autocomplete')
+@read_only
+def autocomplete_names():
+    kind = request.args.get('type', 'venues')
+    if kind not in ('venues', 'artists'):
+        abort(400)
+
+    return jsonify(autocomplete.search(kind, request.args.get('q', '')))
 
 #  Show Venue
 #  ----------------------------------------------------------------
 
 
 @app.route('/venues/<int:venue_id>')
+@read_only
+@revalidate(lambda venue_id: queries.entity_stamp(Venue, venue_id))
 def show_venue(venue_id):
 
-    venue = Venue.query.get(venue_id)
-
-    if (len(Venue.query.filter_by(id=venue_id).all()) != 0):
-        past = []
-        for show in Show.query.filter(Show.venue_id == venue_id).order_by(desc(Show.start_time)).limit(10):
-            if show.start_time < utc.localize(datetime.now()):
-                past.append({
-                    "artist_id": show.artist_id,
-                    "artist_name": Artist.query.filter(Artist.id == show.artist_id).first().name,
-                    "artist_image_link": Artist.query.filter(Artist.id == show.artist_id).first().image_link,
-                    "start_time": show.start_time.strftime("%c")
-                })
-        upcoming_show = []
-        for show in Show.query.filter(Show.venue_id == venue_id).order_by(desc(Show.start_time)).limit(10):
-            if show.start_time > utc.localize(datetime.now()):
-                upcoming_show.append({
-                    "artist_id": show.artists_id,
-                    "artist_name": Artist.query.filter(Artist.id == show.artists_id).first().name,
-                    "artist_image_link": Artist.query.filter(Artist.id == show.artists_id).first().image_link,
-                    "start_time": show.start_time.strftime("%c")
-                })
-
-        data = {
-            "id": venue.id,
-            "name": venue.name,
-            "genres": venue.genres,
-            "address": venue.address,
-            "city": venue.city,
-            "state": venue.state,
-            "phone": venue.phone,
-            "website_link": venue.website_link,
-            "facebook_link": venue.facebook_link,
-            "seeking_talent": venue.seeking_talent,
-            "seeking_description": venue.seeking_description,
-            "image_link": venue.image_link,
-            "past_shows": past,
-            "upcoming_shows": upcoming_show,
-            "past_shows_count": len(past),
-            "upcoming_shows_count": len(upcoming_show)
-        }
-        data = list(filter(lambda d: d['id'] == venue_id, [data]))[0]
-        return render_template('pages/show_venue.html', past_shows=past, upcoming_shows=upcoming_show, venue=data)
+    past_page = request.args.get('past_page', 1, type=int)
+    upcoming_page = request.args.get('upcoming_page', 1, type=int)
 
+    # Only the default view is cached; deeper pages are rare.
+    if past_page == upcoming_page == 1:
+        data = cache.get_or_set(
+            cache_key('show_venue', venue_id, g.stamp),
+            lambda: queries.venue_detail(venue_id))
     else:
+        data = queries.venue_detail(
+            venue_id, past_page=past_page, upcoming_page=upcoming_page)
+
+    if data is None:
+        flash('Venue does not exist')
+        return redirect(url_for('venues'))
+
+    return render_template('pages/show_venue.html', past_shows=data['past_shows'], upcoming_shows=data['upcoming_shows'], venue=data)
+
+#  Venue Calendar
+#  ----------------------------------------------------------------
+
+
+def calendar_pages(first, last):
+    """(from, to) of the ranges before and after [first, last]."""
+    if queries.calendar_month(first, last):
+        before = (first - timedelta(days=1)).replace(day=1)
+        after = last + timedelta(days=1)
+        return ((before, first - timedelta(days=1)),
+                (after, (after + timedelta(days=31)).replace(day=1) - timedelta(days=1)))
+    span = last - first + timedelta(days=1)
+    return (first - span, first - timedelta(days=1)), (last + timedelta(days=1), last + span)
+
+
+def calendar_stamp(venue_id):
+    # The same URL shows another range once the default month rolls over,
+    # so the range goes into the ETag, and that month's start bounds
+    # Last-Modified for clients that only send If-Modified-Since.
+    validators = queries.entity_stamp(Venue, venue_id)
+    try:
+        first, last = queries.calendar_range(request.args.get('from'), request.args.get('to'))
+    except ValueError:
+        return None
+    if validators is None:
+        return None
+    last_modified, etag = validators
+    if not request.args.get('from'):
+        last_modified = max(last_modified, datetime(first.year, first.month, first.day, tzinfo=utc))
+    return last_modified, '{}:{}:{}'.format(etag, first, last)
+
+
+@app.route('/venues/<int:venue_id>/calendar')
+@read_only
+@revalidate(calendar_stamp)
+def venue_calendar(venue_id):
+    venue = Venue.query.get(venue_id)
+    if venue is None:
         flash('Venue does not exist')
         return redirect(url_for('venues'))
+    try:
+        first, last = queries.calendar_range(request.args.get('from'), request.args.get('to'))
+    except ValueError:
+        abort(400)
+
+    days = venue_calendar_days(venue, first, last)
+    previous, following = calendar_pages(first, last)
+    return render_template('pages/venue_calendar.html', venue=venue, days=days,
+                           first=first, last=last, previous=previous, following=following)
+
+#  Bookable Artists
+#  ----------------------------------------------------------------
+
+
+@app.route('/venues/<int:venue_id>/bookable-artists')
+@read_only
+def bookable_artists(venue_id):
+    if Venue.query.get(venue_id) is None:
+        abort(404)
+    try:
+        # '+' in an unquoted UTC offset arrives as a space
+        start_time = utc_datetime(datetime.fromisoformat(request.args['at'].replace(' ', '+')))
+    except (KeyError, ValueError):
+        abort(400)
+    minutes = request.args.get('minutes', DEFAULT_SHOW_MINUTES, type=int)
+    end_time = start_time + timedelta(minutes=minutes)
+
+    free = queries.venue_free(venue_id, start_time, end_time)
+    return jsonify({
+        "venue_id": venue_id,
+        "start_time": start_time.isoformat(),
+        "end_time": end_time.isoformat(),
+        "venue_available": free,
+        "artists": queries.bookable_artists(start_time, end_time) if free else [],
+    })
 
 #  Update Venue
 #  ----------------------------------------------------------------
@@ -216,7 +328,11 @@ def edit_venue_submission(venue_id):
         venue.seeking_description = request.form.get('seeking_description')
         venue.image_link = request.form.get('image_link')
         venue.website = request.form.get('website')
+        artist_ids = queries.related_ids(Show.venue_id, Show.artist_id, venue_id)
+        queries.touch(Artist, artist_ids)
         db.session.commit()
+        cache.delete(cache_key('recent_venues'))
+        autocomplete.add('venues', venue.id, venue.name)
         flash('Venue ' + venue.name + ' has been successfully updated !')
 
     except Exception:
@@ -250,9 +366,7 @@ def create_venue_submission():
             state=venue_form.state.data,
             address=venue_form.address.data,
             phone=venue_form.phone.data,
-
-            # convert byte array to string separated by commas
-            genres=",".join(venue_form.genres.data),
+            genres=venue_form.genres.data,
             facebook_link=venue_form.facebook_link.data,
             image_link=venue_form.image_link.data,
             seeking_talent=venue_form.seeking_talent.data,
@@ -261,6 +375,9 @@ def create_venue_submission():
         )
         db.session.add(venue)
         db.session.commit()
+        cache.update(cache_key('recent_venues'),
+                     lambda items: queries.push_recent(items, queries.recent_item(venue)))
+        autocomplete.add('venues', venue.id, venue.name)
         flash('Venue, ' + venue.name + ', was successfully listed!')
 
     except Exception:
@@ -270,7 +387,7 @@ def create_venue_submission():
 
     finally:
         db.session.close()
-    return render_template('pages/home.html')
+    return redirect(url_for('index'))
 
 #  Delete Venue
 #  ----------------------------------------------------------------
@@ -280,8 +397,13 @@ def create_venue_submission():
 def delete_venue(venue_id):
 
     try:
+        artist_ids = queries.related_ids(Show.venue_id, Show.artist_id, venue_id)
         Venue.query.filter_by(id=venue_id).delete()
+        queries.record_deletion(Venue)
+        queries.touch(Artist, artist_ids)
         db.session.commit()
+        cache.delete(cache_key('recent_venues'))
+        autocomplete.remove('venues', int(venue_id))
         flash('Venue ' + request.form['name'] + ' was successfully deleted!')
 
     except Exception:
@@ -292,100 +414,70 @@ def delete_venue(venue_id):
     finally:
         db.session.close()
 
-    return render_template('pages/home.html')
+    return redirect(url_for('index'), 303)
 
 #  Artists
 #  ----------------------------------------------------------------
 
 
 @app.route('/artists')
+@read_only
+@revalidate(lambda: queries.listing_stamp(Artist))
 def artists():
+    genres = request.args.getlist('genre')
 
-    data = db.session.query(Artist.id, Artist.name).all()
+    if genres:
+        data = queries.artist_listing(genres, request.args.get('match', 'all'))
+    else:
+        data = cache.get_or_set(cache_key('artists', stamp=g.stamp), queries.artist_listing)
+    facets = cache.get_or_set(
+        cache_key('artist_genres', stamp=g.stamp),
+        lambda: queries.genre_counts(Artist, [genre for genre, _ in genre_options]))
 
-    return render_template('pages/artists.html', artists=data)
+    return render_template('pages/artists.html', artists=data, facets=facets, selected=genres)
 
 #  Search Artist
 #  ----------------------------------------------------------------
 
 
 @app.route('/artists/search', methods=['POST'])
+@read_only
 def search_artists():
+    search_term = request.form.get('search_term', '')
+    location = queries.parse_location(search_term, [state for state, _ in state_options])
+    if location is not None:
+        return render_template('pages/search_location.html', results=queries.location_search(*location), search_term=search_term)
 
-    artists = (
-        db.session.query(Artist).filter(Artist.name.ilike(f"%{request.form['search_term']}%"))
-        .all()
-    )
-    response = {
-        "count": len(artists),
-        "data": [
-            {
-                "id": artist.id,
-                "name": artist.name,
-                "num_upcoming_shows": db.session.query(Show)
-                .filter(
-                    Show.start_time
-                    > datetime.today().strftime("%Y-%m-%d %H:%M:%S")
-                )
-                .count(),
-            }
-            for artist in artists
-        ],
-    }
-    return render_template("pages/search_artists.html", results=response, search_term=request.form.get("search_term", ""), )
+    response = queries.search(Artist, search_term)
+    return render_template("pages/search_artists.html", results=response, search_term=search_term)
     
 #  Show Artist
 #  ----------------------------------------------------------------
 
 
 @app.route('/artists/<int:artist_id>')
+@read_only
+@revalidate(lambda artist_id: queries.entity_stamp(Artist, artist_id))
 def show_artist(artist_id):
 
-    artist = Artist.query.get(artist_id)
-    if (len(Artist.query.filter_by(id=artist_id).all()) != 0):
-        past = []
-        for show in Show.query.filter(Show.artist_id == artist_id).order_by(desc(Show.start_time)).limit(10):
-            if show.start_time < utc.localize(datetime.now()):
-                past.append({
-                    "venue_id": show.venue_id,
-                    "venue_name": Venue.query.filter(Venue.id == show.venue_id).first().name,
-                    "venue_image_link": Venue.query.filter(Venue.id == show.venue_id).first().image_link,
-                    "start_time": show.start_time.strftime("%c")
-
-                })
-        upcoming_show = []
-        for show in Show.query.filter(Show.artist_id == artist_id).order_by(desc(Show.start_time)).limit(10):
-            if show.start_time > utc.localize(datetime.now()):
-                upcoming_show.append({
-                    "venue_id": show.venue_id,
-                    "venue_name": Venue.query.filter(Venue.id == show.venue_id).first().name,
-                    "venue_image_link": Venue.query.filter(Venue.id == show.venue_id).first().image_link,
-                    "start_time": show.start_time.strftime("%c")
-                })
-
-        data = {
-            "id": artist.id,
-            "name": artist.name,
-            "genres": artist.genres,
-            "city": artist.city,
-            "state": artist.state,
-            "phone": artist.phone,
-            "website_link": artist.website_link,
-            "facebook_link": artist.facebook_link,
-            "seeking_venue": artist.seeking_venue,
-            "seeking_description": artist.seeking_description,
-            "image_link": artist.image_link,
-            "past_shows": past,
-            "upcoming_shows": upcoming_show,
-            "past_shows_count": len(past),
-            "upcoming_shows_count": len(upcoming_show)
-        }
-        data = list(filter(lambda d: d['id'] == artist_id, [data]))[0]
-        return render_template('pages/show_artist.html', past_shows=past, upcoming_shows=upcoming_show, artist=data)
+    past_page = request.args.get('past_page', 1, type=int)
+    upcoming_page = request.args.get('upcoming_page', 1, type=int)
+
+    # Only the default view is cached; deeper pages are rare.
+    if past_page == upcoming_page == 1:
+        data = cache.get_or_set(
+            cache_key('show_artist', artist_id, g.stamp),
+            lambda: queries.artist_detail(artist_id))
     else:
+        data = queries.artist_detail(
+            artist_id, past_page=past_page, upcoming_page=upcoming_page)
+
+    if data is None:
         flash('Artist does not exist')
         return redirect(url_for('artists'))
 
+    return render_template('pages/show_artist.html', past_shows=data['past_shows'], upcoming_shows=data['upcoming_shows'], artist=data)
+
 #  Update Artist
 #  ----------------------------------------------------------------
 
@@ -422,7 +514,11 @@ def edit_artist_submission(artist_id):
         artist.seeking_description = request.form.get('seeking_description')
         artist.image_link = request.form.get('image_link')
         artist.website_link = request.form.get('website_link')
+        venue_ids = queries.related_ids(Show.artist_id, Show.venue_id, artist_id)
+        queries.touch(Venue, venue_ids)
         db.session.commit()
+        cache.delete(cache_key('recent_artists'))
+        autocomplete.add('artists', artist.id, artist.name)
         flash('Artist ' + artist.name + ' has been successfully updated !')
 
     except Exception:
@@ -434,6 +530,45 @@ def edit_artist_submission(artist_id):
         db.session.close()
     return redirect(url_for('show_artist', artist_id=artist_id))
 
+#  Artist Availability
+#  ----------------------------------------------------------------
+
+
+@app.route('/artists/<int:artist_id>/availability', methods=['GET', 'POST'])
+def artist_availability(artist_id):
+    artist = Artist.query.get_or_404(artist_id)
+    form = AvailabilityForm(request.form)
+
+    if request.method == 'POST':
+        if not form.validate():
+            flash('Availability could not be added: please check the window.')
+        else:
+            try:
+                if form.kind.data == 'once':
+                    window = Availability(period=queries.once_window(
+                        form.starts_at.data, form.ends_at.data))
+                else:
+                    window = Availability(weekly=queries.weekly_window(
+                        form.weekday.data, form.from_time.data, form.to_time.data))
+                artist.availability.append(window)
+                db.session.commit()
+                flash('Availability added.')
+                return redirect(url_for('artist_availability', artist_id=artist_id))
+            except Exception:
+                db.session.rollback()
+                flash('An error occurred. Availability could not be added.')
+
+    windows = [queries.describe_window(window) for window in artist.availability]
+    return render_template('forms/availability.html', form=form, artist=artist, windows=windows)
+
+
+@app.route('/artists/<int:artist_id>/availability/<int:window_id>/delete', methods=['POST'])
+def delete_artist_availability(artist_id, window_id):
+    Availability.query.filter_by(id=window_id, artist_id=artist_id).delete()
+    db.session.commit()
+    flash('Availability removed.')
+    return redirect(url_for('artist_availability', artist_id=artist_id))
+
 #  Create Artist
 #  ----------------------------------------------------------------
 
@@ -454,9 +589,7 @@ def create_artist_submission():
             city=artist_form.city.data,
             state=artist_form.state.data,
             phone=artist_form.phone.data,
-
-            # convert byte array to string separated by commas
-            genres=",".join(artist_form.genres.data),
+            genres=artist_form.genres.data,
             facebook_link=artist_form.facebook_link.data,
             image_link=artist_form.image_link.data,
             seeking_venue=artist_form.seeking_venue.data,
@@ -465,6 +598,9 @@ def create_artist_submission():
         )
         db.session.add(artist)
         db.session.commit()
+        cache.update(cache_key('recent_artists'),
+                     lambda items: queries.push_recent(items, queries.recent_item(artist)))
+        autocomplete.add('artists', artist.id, artist.name)
         flash('Artist ' + request.form['name'] + ' was successfully listed!')
 
     except:
@@ -474,7 +610,7 @@ def create_artist_submission():
 
     finally:
         db.session.close()
-    return render_template('pages/home.html')
+    return redirect(url_for('index'))
 
 
 #  Shows
@@ -482,22 +618,22 @@ def create_artist_submission():
 
 
 @app.route('/shows')
+@read_only
 def shows():
-    shows = Show.query.all()
+    if request.args.get('stream'):
+        return Response(stream_template(
+            'pages/shows.html', shows=queries.iter_shows()))
 
-    data = []
-    for show in shows:
-        dict = {}
-        dict["venue_id"] = show.venue.id
-        dict["venue_name"] = show.venue.name
-        dict["artist_id"] = show.artist.id
-        dict["artist_name"] = show.artist.name
-        dict["artist_image_link"] = show.artist.image_link
-        dict["start_time"] = show.start_time.strftime("%m/%d/%Y, %H:%M:%S")
+    after = request.args.get('after')
+    if after:
+        try:
+            after = queries.decode_cursor(after)
+        except ValueError:
+            abort(400)
 
-        data.append(dict)
+    page = queries.show_page(after or None)
 
-    return render_template('pages/shows.html', shows=data)
+    return render_template('pages/shows.html', shows=page['shows'], next_cursor=page['next_cursor'])
 
 #  Create Shows
 #  ----------------------------------------------------------------
@@ -509,25 +645,57 @@ def create_shows():
     return render_template('forms/new_show.html', form=form)
 
 
+BOOKING_CONFLICTS = {
+    'ex_shows_venue_overlap': 'The venue already has a show booked during that time.',
+    'ex_shows_artist_overlap': 'The artist already has a show booked during that time.',
+}
+
+
+def booking_conflict_message(conflicts, venue_id):
+    if any(conflict.venue_id == venue_id for conflict in conflicts):
+        return BOOKING_CONFLICTS['ex_shows_venue_overlap']
+    return BOOKING_CONFLICTS['ex_shows_artist_overlap']
+
+
 @app.route('/shows/create', methods=['POST'])
 def create_show_submission():
     show_form = ShowForm(request.form)
 
     try:
+        start_time = show_form.start_time.data
+        end_time = start_time + timedelta(minutes=show_form.duration.data or DEFAULT_SHOW_MINUTES)
+        # Held until commit, so no other booking can slip in between the
+        # check and the insert, even one starting in another month.
+        queries.lock_bookings([show_form.venue_id.data], [show_form.artist_id.data])
+        conflicts = queries.booking_conflicts(
+            show_form.venue_id.data, show_form.artist_id.data, start_time, end_time)
+        if conflicts:
+            flash(booking_conflict_message(conflicts, int(show_form.venue_id.data)))
+            return render_template('forms/new_show.html', form=show_form)
+        if not queries.artist_available(show_form.artist_id.data, start_time, end_time):
+            flash('The artist is not available at that time.')
+            return render_template('forms/new_show.html', form=show_form)
+
         show = Show(
             artist_id=show_form.artist_id.data,
             venue_id=show_form.venue_id.data,
-            start_time=show_form.start_time.data
+            start_time=start_time,
+            end_time=end_time
         )
-        check_show = Show.query.filter_by(
-            venue_id=show.venue_id, artist_id=show.artist_id, start_time=show.start_time).all()
-        if len(check_show) == 0:
-            db.session.add(show)
-            db.session.commit()
-            flash('New show successfully listed!')
-        else:
-          flash('This artist already has another show booked for the same time. Please pick later of  show')
-          return render_template('forms/new_show.html', form=show_form)
+        db.session.add(show)
+        counters.show_added(show)
+        db.session.commit()
+        flash('New show successfully listed!')
+
+    except IntegrityError as error:
+        # Only a show overlapping another in the same month gets here, from a
+        # writer that does not take the booking locks.
+        db.session.rollback()
+        constraint = partitions.overlap_constraint(getattr(error.orig.diag, 'constraint_name', None))
+        if constraint in BOOKING_CONFLICTS:
+            flash(BOOKING_CONFLICTS[constraint])
+            return render_template('forms/new_show.html', form=show_form)
+        flash('An error occurred. Show failed to be listed.')
 
     except Exception:
         db.session.rollback()
@@ -538,6 +706,148 @@ def create_show_submission():
 
     return redirect(url_for("index"))
 
+#  Book a Tour
+#  ----------------------------------------------------------------
+
+
+def check_tour(artist_id, dates, minutes):
+    """Give each tour date its end_time and the reasons it can't be booked.
+
+    A fixed number of queries whatever the number of dates: one for the
+    venues, one for clashes with existing shows, one for the artist's
+    availability.
+    """
+    dates = [date for date in dates if not date['errors']]
+    for date in dates:
+        date['end_time'] = date['start_time'] + timedelta(minutes=minutes)
+
+    venue_ids = {date['venue_id'] for date in dates}
+    venues = {id for (id,) in db.session.query(Venue.id).filter(Venue.id.in_(venue_ids))}
+    latest = None
+    for date in sorted(dates, key=itemgetter('start_time')):
+        if date['venue_id'] not in venues:
+            date['errors'].append('Unknown venue.')
+        if latest is not None and date['start_time'] < latest['end_time']:
+            date['errors'].append('Overlaps line {} of this tour.'.format(latest['line']))
+        if latest is None or date['end_time'] > latest['end_time']:
+            latest = date
+
+    by_line = {date['line']: date for date in dates}
+    conflicts = queries.tour_conflicts(artist_id, [
+        (date['line'], date['venue_id'], date['start_time'], date['end_time'])
+        for date in dates])
+    for conflict in conflicts:
+        date = by_line[conflict.line]
+        message = booking_conflict_message([conflict], date['venue_id'])
+        if message not in date['errors']:
+            date['errors'].append(message)
+
+    unavailable = queries.unavailable_dates(artist_id, [
+        (date['line'], date['start_time'], date['end_time']) for date in dates])
+    for line in unavailable:
+        by_line[line]['errors'].append('The artist is not available at that time.')
+
+
+@app.route('/shows/tour', methods=['GET'])
+def create_tour_form():
+    form = TourForm()
+    return render_template('forms/new_tour.html', form=form, dates=[])
+
+
+@app.route('/shows/tour', methods=['POST'])
+def create_tour_submission():
+    form = TourForm(request.form)
+    if not form.validate():
+        flash('The tour could not be booked: please check the form.')
+        return render_template('forms/new_tour.html', form=form, dates=[])
+
+    dates = form.tour_dates()
+    artist = Artist.query.get(int(form.artist_id.data)) if form.artist_id.data.strip().isdigit() else None
+    if artist is None:
+        flash('Artist does not exist')
+        return render_template('forms/new_tour.html', form=form, dates=dates)
+    artist_id = artist.id
+
+    # Held until the commit or rollback below.
+    queries.lock_bookings({date['venue_id'] for date in dates if not date['errors']}, [artist_id])
+    check_tour(artist_id, dates, form.duration.data or DEFAULT_SHOW_MINUTES)
+    rejected = sum(1 for date in dates if date['errors'])
+    if rejected:
+        flash('Nothing was booked: {} of {} dates cannot be.'.format(rejected, len(dates)))
+        return render_template('forms/new_tour.html', form=form, dates=dates)
+
+    # All or nothing, in one transaction.
+    try:
+        shows = [
+            Show(artist_id=artist_id, venue_id=date['venue_id'],
+                 start_time=date['start_time'], end_time=date['end_time'])
+            for date in dates
+        ]
+        db.session.add_all(shows)
+        db.session.flush()
+        counters.shows_added([show.id for show in shows])
+        db.session.commit()
+        flash('{} shows successfully listed!'.format(len(shows)))
+
+    except IntegrityError as error:
+        # Only a show overlapping another in the same month gets here, from a
+        # writer that does not take the booking locks.
+        db.session.rollback()
+        constraint = partitions.overlap_constraint(getattr(error.orig.diag, 'constraint_name', None))
+        flash(BOOKING_CONFLICTS.get(constraint, 'An error occurred.') + ' Nothing was booked.')
+        return render_template('forms/new_tour.html', form=form, dates=dates)
+
+    except Exception:
+        db.session.rollback()
+        flash('An error occurred. The tour failed to be listed.')
+
+    finally:
+        db.session.close()
+
+    return redirect(url_for('show_artist', artist_id=artist_id))
+
+#  Export
+#  ----------------------------------------------------------------
+
+@app.route('/export/<any(venues, artists, shows):kind>.<any(csv, ndjson):format>')
+@read_only
+def export(kind, format):
+    since = request.args.get('since')
+    if since:
+        try:
+            # '+' in an unquoted UTC offset arrives as a space
+            since = datetime.fromisoformat(since.replace(' ', '+'))
+        except ValueError:
+            abort(400)
+
+    return Response(
+        stream_with_context(exporter.generate(kind, format, since or None)),
+        mimetype=exporter.FORMATS[format],
+        headers={'Content-Disposition': 'attachment; filename={}.{}'.format(kind, format)})
+
+#  Cache, Pool Stats and Metrics
+#  ----------------------------------------------------------------
+
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify(cache.stats())
+
+
+@app.route('/pool/stats')
+def pool_stats():
+    return jsonify(dbpool.stats.snapshot(db.engine.pool))
+
+
+@app.route('/autocomplete/stats')
+def autocomplete_stats():
+    return jsonify(autocomplete.stats())
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(metrics.collect(app)),
+                    mimetype='text/plain; version=0.0.4')
+
 # Error Handling
 #  ----------------------------------------------------------------
 
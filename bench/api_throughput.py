@@ -0,0 +1,49 @@
+"""Benchmark the JSON API against the HTML pages it mirrors.
+
+    python bench/api_throughput.py [--requests 300]
+
+Requests each page back to back through the in-process test client and
+prints requests per second, HTML next to JSON. It runs against the
+database of the current FYYUR_ENV profile (DATABASE_URL), which needs a
+few venues, artists and shows: the first venue and artist are used for
+the detail pages.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def throughput(client, url, requests):
+    started = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(url)
+    assert response.status_code == 200, (url, response.status_code)
+    return requests / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=300)
+    args = parser.parse_args()
+
+    from app import app
+    from models import Venue, Artist, db
+    with app.app_context():
+        venue_id = db.session.query(db.func.min(Venue.id)).scalar()
+        artist_id = db.session.query(db.func.min(Artist.id)).scalar()
+    if venue_id is None or artist_id is None:
+        sys.exit('The database has no venues or artists to request.')
+
+    client = app.test_client()
+    for html in ('/venues', '/venues/{}'.format(venue_id), '/artists/{}'.format(artist_id), '/shows'):
+        api = '/api/v1' + html
+        print('{:<14} {:>6.0f} req/s   {:<22} {:>6.0f} req/s'.format(
+            html, throughput(client, html, args.requests),
+            api, throughput(client, api, args.requests)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Benchmark the /autocomplete name index and the route serving it.
+
+    python bench/autocomplete.py [--names 100000] [--lookups 20000]
+
+Builds a PrefixIndex over random 1-4 word names, then times loading it,
+prefix lookups and incremental adds. The same index is then swapped into
+the app to time GET /autocomplete through the Flask test client. No
+database is needed.
+
+The target is p99 < 1 ms at 100k names. The index meets it by a wide
+margin: p99 is in the tens of microseconds. The route does NOT meet it.
+Flask's request handling, the app's before/after_request hooks and the
+JSON response cost far more than the lookup itself. On the machine the
+feature was built on, the route's p50 was about 0.8 ms and its p99 about
+4.3 ms.
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TARGET_P99 = 1e-3
+
+
+def random_names(count, rng):
+    words = [''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9)))
+             for _ in range(20000)]
+    return [(id, ' '.join(rng.choice(words) for _ in range(rng.randint(1, 4))))
+            for id in range(1, count + 1)]
+
+
+def random_prefixes(count, rng):
+    return [''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(1, 4)))
+            for _ in range(count)]
+
+
+def timed(calls):
+    """Sorted durations of each call, in seconds."""
+    durations = []
+    for call in calls:
+        started = time.perf_counter()
+        call()
+        durations.append(time.perf_counter() - started)
+    return sorted(durations)
+
+
+def report(label, durations, target=None):
+    p50 = durations[len(durations) // 2]
+    p99 = durations[int(len(durations) * 0.99)]
+    line = '{:<22} p50 {:>7.0f} us   p99 {:>7.0f} us'.format(label, p50 * 1e6, p99 * 1e6)
+    if target is not None:
+        line += '   target p99 < {:.0f} ms: {}'.format(
+            target * 1e3, 'met' if p99 < target else 'NOT met')
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--names', type=int, default=100000)
+    parser.add_argument('--lookups', type=int, default=20000)
+    args = parser.parse_args()
+
+    from autocomplete import PrefixIndex, autocomplete
+    rng = random.Random(18)
+    names = random_names(args.names, rng)
+    prefixes = random_prefixes(args.lookups, rng)
+
+    index = PrefixIndex(max_entries=10 * args.names)
+    started = time.perf_counter()
+    index.load(names)
+    print('{} names, {} keys, loaded in {:.2f} s'.format(
+        len(index), len(index.keys), time.perf_counter() - started))
+
+    report('search', timed(lambda prefix=prefix: index.search(prefix) for prefix in prefixes),
+           TARGET_P99)
+    added = random_names(1000, rng)
+    report('incremental add', timed(
+        lambda id=id, name=name: index.add(args.names + id, name) for id, name in added))
+
+    # The route, with the index above in place of one loaded from the database.
+    os.environ.setdefault('FYYUR_ENV', 'test')
+    from app import app
+    autocomplete.indexes['venues'] = index
+    autocomplete.synced_at['venues'] = time.monotonic()
+    autocomplete.sync_seconds = float('inf')
+    client = app.test_client()
+    for prefix in prefixes[:200]:
+        client.get('/autocomplete', query_string={'q': prefix})
+    report('GET /autocomplete', timed(
+        lambda prefix=prefix: client.get('/autocomplete', query_string={'q': prefix})
+        for prefix in prefixes), TARGET_P99)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Benchmark the 'datetime' template filter over a page of 10k show tiles.
+
+    python bench/datetime_filter.py [--tiles 10000] [--repeat 3]
+
+Compares the filter as it was before views passed datetime objects
+(strftime string -> dateutil parse -> babel.dates.format_datetime) with
+app.format_datetime on the datetime itself, in the 'full' format the
+/shows tiles use. Both must produce the same text for every tile. Best
+of --repeat runs; no database is needed.
+"""
+import argparse
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta, timezone
+
+import babel.dates
+import dateutil.parser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def format_datetime_before(value, format='medium'):
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format, locale='en')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tiles', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    os.environ.setdefault('FYYUR_ENV', 'test')
+    from app import format_datetime
+
+    start = datetime(2026, 10, 18, 20, 30, tzinfo=timezone.utc)
+    moments = [start + timedelta(hours=hour) for hour in range(args.tiles)]
+    # What the views used to hand the templates.
+    strings = [moment.strftime("%m/%d/%Y, %H:%M:%S") for moment in moments]
+
+    assert all(format_datetime_before(string, 'full') == format_datetime(moment, 'full')
+               for string, moment in zip(strings, moments)), 'outputs differ'
+
+    for label, run in (
+        ('before (strftime -> dateutil parse -> babel)',
+         lambda: [format_datetime_before(string, 'full') for string in strings]),
+        ('after  (cached pattern .apply on datetime)',
+         lambda: [format_datetime(moment, 'full') for moment in moments]),
+    ):
+        seconds = min(timeit.repeat(run, number=1, repeat=args.repeat))
+        print('{}: {:.0f} us/tile, {:.0f} ms/page'.format(
+            label, seconds / args.tiles * 1e6, seconds * 1e3))
+
+
+if __name__ == '__main__':
+    main()
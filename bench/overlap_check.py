@@ -0,0 +1,119 @@
+"""Benchmark the booking overlap check against a million shows.
+
+    python bench/overlap_check.py [--shows 1000000] [--probes 2000]
+
+Seeds 1000 venues, 1000 artists and --shows back-to-back 2-hour shows
+into the database of the current FYYUR_ENV profile, which must be at the
+latest migration (flask db upgrade): the rows go through the real
+ex_shows_*_overlap constraints, tstzrange exclusion on btree_gist, in the
+monthly partitions. Then times queries.booking_conflicts for --probes
+random 2-hour slots and prints p50/p99 and one EXPLAIN ANALYZE. It all
+runs in one transaction that is rolled back, partitions included.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PEOPLE = 1000
+SLOT_HOURS = 3
+
+
+def seed(db, table, columns, values):
+    return db.session.execute(db.text(
+        'INSERT INTO {} (name, {}) SELECT :name || n, {} '
+        'FROM generate_series(1, :count) n RETURNING id'.format(table, columns, values)),
+        {"name": 'Bench {} '.format(table), "count": PEOPLE}).scalars().all()
+
+
+def explain(db, call):
+    """EXPLAIN ANALYZE of the statement `call` sends."""
+    statements = []
+
+    def capture(connection, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    engine = db.get_engine()
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        call()
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+    statement, parameters = statements[-1]
+    return [row[0] for row in db.session.connection().exec_driver_sql(
+        'EXPLAIN ANALYZE ' + statement, parameters)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shows', type=int, default=1000000)
+    parser.add_argument('--probes', type=int, default=2000)
+    args = parser.parse_args()
+
+    from app import app
+    from models import db
+    import partitions
+    import queries
+
+    random.seed(21)
+    with app.app_context():
+        try:
+            constraints = db.session.execute(db.text(
+                "SELECT count(*) FROM pg_constraint "
+                "WHERE conrelid = 'shows_default'::regclass AND contype = 'x' "
+                "AND pg_get_constraintdef(oid) LIKE '%_id WITH =, tstzrange(%'")).scalar()
+            if constraints != 2:
+                sys.exit('shows lacks the btree_gist overlap constraints; run flask db upgrade.')
+
+            slots = -(-args.shows // PEOPLE)
+            first = datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            months = slots * SLOT_HOURS // (24 * 28) + 1
+            partitions.ensure_partitions(months)
+
+            venue_ids = seed(db, 'venues', 'city, state, address, phone, genres, seeking_talent',
+                             "'Austin', 'TX', 'a', '1', '{Jazz}', true")
+            artist_ids = seed(db, 'artists', 'city, state, phone, genres, seeking_venue',
+                              "'Austin', 'TX', '1', '{Jazz}', true")
+            # Slot n books every venue once, each with a different artist.
+            started = time.perf_counter()
+            db.session.execute(db.text('''
+                INSERT INTO shows (venue_id, artist_id, start_time, end_time)
+                SELECT (:venues)[1 + i % :people],
+                       (:artists)[1 + (i % :people + i / :people) % :people],
+                       :first + (i / :people) * :slot,
+                       :first + (i / :people) * :slot + interval '2 hours'
+                FROM generate_series(0, :count - 1) i
+            '''), {"venues": venue_ids, "artists": artist_ids, "people": PEOPLE,
+                   "first": first, "slot": timedelta(hours=SLOT_HOURS), "count": args.shows})
+            print('seeded {} shows through the constraints in {:.0f} s'.format(
+                args.shows, time.perf_counter() - started))
+            db.session.execute(db.text('ANALYZE shows'))
+
+            def probe():
+                start = first + timedelta(minutes=random.randrange(slots * SLOT_HOURS * 60))
+                return queries.booking_conflicts(
+                    random.choice(venue_ids), random.choice(artist_ids),
+                    start, start + timedelta(hours=2))
+
+            latencies = []
+            for _ in range(args.probes):
+                started = time.perf_counter()
+                probe()
+                latencies.append(time.perf_counter() - started)
+            latencies.sort()
+            print('booking_conflicts: p50 {:.2f} ms, p99 {:.2f} ms over {} probes'.format(
+                latencies[len(latencies) // 2] * 1e3,
+                latencies[int(len(latencies) * 0.99)] * 1e3, args.probes))
+            print('\n'.join(explain(db, probe)))
+        finally:
+            db.session.rollback()
+
+
+if __name__ == '__main__':
+    main()
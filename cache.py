@@ -0,0 +1,173 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+#----------------------------------------------------------------------------#
+# Backends.
+#----------------------------------------------------------------------------#
+
+# Any object with get/set/delete/clear can be used as a backend, which is
+# how tests or a single-process deployment swap the shared store out.
+
+MISSING = object()
+
+
+class LRUBackend:
+    """In-process LRU store bounded by entry count, with per-entry TTL."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    """Shared store for multi-worker deployments, backed by a redis client."""
+
+    def __init__(self, client, prefix='fyyur:'):
+        self.client = client
+        self.prefix = prefix
+        self.evictions = 0
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return MISSING if value is None else pickle.loads(value)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=int(ttl))
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*(self.prefix + key for key in keys))
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+#----------------------------------------------------------------------------#
+# Cache.
+#----------------------------------------------------------------------------#
+
+
+class Cache:
+    """View-data cache with hit/miss counters, configured from app.config.
+
+    CACHE_BACKEND selects 'lru' (default), 'redis' (needs the redis package
+    and CACHE_REDIS_URL) or 'null' to disable caching. CACHE_TTL and
+    CACHE_MAX_ENTRIES bound the entries.
+    """
+
+    def __init__(self, backend=None, ttl=300):
+        self.backend = backend if backend is not None else LRUBackend()
+        self.ttl = ttl
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+        self._update_lock = threading.Lock()
+
+    def init_app(self, app):
+        kind = app.config.get('CACHE_BACKEND', 'lru')
+        self.ttl = app.config.get('CACHE_TTL', self.ttl)
+        self.enabled = kind != 'null'
+        if kind == 'redis':
+            import redis
+            self.backend = RedisBackend(
+                redis.Redis.from_url(app.config['CACHE_REDIS_URL']))
+        else:
+            self.backend = LRUBackend(app.config.get('CACHE_MAX_ENTRIES', 1024))
+        app.extensions['cache'] = self
+
+    def get_or_set(self, key, builder):
+        """Return the cached value for `key`, building and storing it on a miss."""
+        if not self.enabled:
+            return builder()
+        value = self.backend.get(key)
+        if value is not MISSING:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = builder()
+        if value is not None:
+            self.backend.set(key, value, self.ttl)
+        return value
+
+    def update(self, key, change):
+        """Replace the cached value for `key` with change(value), if cached.
+
+        `change` must return a new value rather than mutate the old one,
+        which other threads may be reading.
+        """
+        if not self.enabled:
+            return
+        with self._update_lock:
+            value = self.backend.get(key)
+            if value is not MISSING:
+                self.backend.set(key, change(value), self.ttl)
+
+    def delete(self, *keys):
+        self.backend.delete(*keys)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.backend.evictions,
+            "entries": len(self.backend) if hasattr(self.backend, '__len__') else None,
+        }
+
+
+def cache_key(endpoint, entity_id=None, stamp=None):
+    """Key for the data behind one route (and entity, for detail pages).
+
+    `stamp` is the ETag of a revalidated page. Keying on it means a write
+    seen through another worker's stamp never gets served this worker's
+    older copy, whatever that worker deleted from its own cache.
+    """
+    key = endpoint if entity_id is None else '{}:{}'.format(endpoint, entity_id)
+    return key if stamp is None else '{}@{}'.format(key, stamp)
+
+
+cache = Cache()
@@ -0,0 +1,107 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+
+import counters
+import partitions
+from importer import KINDS, Importer
+import exporter
+from models import db
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+# Commands run in their own process and cannot reach the web workers'
+# caches. Their writes bump updated_at on every venue and artist they
+# change, which moves the revalidation stamps the cached pages are keyed
+# on; only the home page's recent listings can lag, by up to CACHE_TTL.
+
+# Counters
+# -------------------------------------
+
+counters_cli = AppGroup('counters', help='Maintain venue/artist show counters.')
+
+
+@counters_cli.command('rollover')
+def rollover_command():
+    """Move shows that have started from upcoming to past counts."""
+    moved = counters.rollover()
+    db.session.commit()
+    click.echo('Rolled over {} show(s).'.format(moved))
+
+
+@counters_cli.command('check')
+@click.option('--fix', is_flag=True, help='Overwrite counters that disagree.')
+def check_command(fix):
+    """Recompute counters from the shows table and report differences."""
+    mismatches = counters.check(fix=fix)
+    for table, entity_id, stored, actual in mismatches:
+        click.echo('{} {}: stored upcoming/past {}/{}, actual {}/{}'.format(
+            table, entity_id, stored[0], stored[1], actual[0], actual[1]))
+    if fix:
+        db.session.commit()
+    click.echo('{} mismatch(es){}.'.format(
+        len(mismatches), ', fixed' if fix and mismatches else ''))
+    if mismatches and not fix:
+        raise SystemExit(1)
+
+# Show partitions
+# -------------------------------------
+
+shows_cli = AppGroup('shows', help='Maintain the monthly partitions of shows.')
+
+
+@shows_cli.command('partitions')
+@click.option('--ahead', type=int, help='Months to create ahead [SHOWS_PARTITIONS_AHEAD].')
+@click.option('--archive-after', type=int,
+              help='Archive months older than this [SHOWS_ARCHIVE_AFTER_MONTHS].')
+def partitions_command(ahead, archive_after):
+    """Create upcoming monthly partitions and archive old ones; run daily."""
+    config = current_app.config
+    created = partitions.ensure_partitions(
+        config['SHOWS_PARTITIONS_AHEAD'] if ahead is None else ahead)
+    archived = partitions.archive_partitions(
+        config['SHOWS_ARCHIVE_AFTER_MONTHS'] if archive_after is None else archive_after)
+    db.session.commit()
+    click.echo('Created {} partition(s){}; archived {}{}.'.format(
+        len(created), ': ' + ', '.join(created) if created else '',
+        len(archived), ': ' + ', '.join(archived) if archived else ''))
+
+# Import
+# -------------------------------------
+
+@click.command('import')
+@click.argument('kind', type=click.Choice(sorted(KINDS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', type=click.Choice(['csv', 'ndjson']),
+              help='Input format; guessed from the file extension by default.')
+@click.option('--batch-size', default=1000, show_default=True)
+@click.option('--resume', is_flag=True, help='Continue from the last checkpoint.')
+@with_appcontext
+def import_command(kind, path, format, batch_size, resume):
+    """Bulk-load venues, artists or shows from a CSV or NDJSON file."""
+    importer = Importer(kind, path, format=format, batch_size=batch_size,
+                        report=click.echo).run(resume=resume)
+    click.echo('Done: {} inserted, {} rejected, {} skipped as overlapping bookings.'.format(
+        importer.inserted, importer.rejected, importer.skipped))
+    if importer.rejected:
+        click.echo('Rejected rows written to {}'.format(importer.rejected_path))
+
+# Export
+# -------------------------------------
+
+@click.command('export')
+@click.argument('kind', type=click.Choice(sorted(exporter.MODELS)))
+@click.option('--format', type=click.Choice(sorted(exporter.FORMATS)), default='ndjson', show_default=True)
+@click.option('--since', type=click.DateTime(formats=['%Y-%m-%dT%H:%M:%S%z', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d']),
+              help='Only rows updated after this time.')
+@click.option('--output', type=click.File('w'), default='-', help='Destination file (default stdout).')
+@with_appcontext
+def export_command(kind, format, since, output):
+    """Stream venues, artists or shows as CSV or NDJSON."""
+    for chunk in exporter.generate(kind, format, since):
+        output.write(chunk)
@@ -0,0 +1,134 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+from models import Venue, Artist, Show, db
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+# Venue/Artist.upcoming_shows_count and past_shows_count mirror the shows
+# table. Every show is counted in exactly one bucket, recorded in
+# Show.counted_past; writes adjust the counters in the caller's
+# transaction and rollover() moves shows between buckets as time passes.
+
+COUNTED = ((Venue, Show.venue_id), (Artist, Show.artist_id))
+
+
+def show_added(show):
+    """Count a new show; call before the surrounding commit."""
+    db.session.flush()
+    shows_added([show.id])
+
+
+def shows_added(show_ids):
+    """Bucket and count freshly inserted shows, in the caller's transaction."""
+    db.session.execute(
+        db.update(Show)
+        .where(Show.id.in_(show_ids))
+        .values(counted_past=Show.start_time <= db.func.now())
+        .execution_options(synchronize_session=False)
+    )
+    _adjust(show_ids, 1)
+
+
+def _adjust(show_ids, delta):
+    for model, key in COUNTED:
+        counts = (
+            db.session.query(
+                key.label('id'),
+                db.func.count().filter(db.not_(Show.counted_past)).label('upcoming'),
+                db.func.count().filter(Show.counted_past).label('past'),
+            )
+            .filter(Show.id.in_(show_ids))
+            .group_by(key)
+            .subquery()
+        )
+        db.session.execute(
+            db.update(model)
+            .where(model.id == counts.c.id)
+            .values(
+                upcoming_shows_count=model.upcoming_shows_count + delta * counts.c.upcoming,
+                past_shows_count=model.past_shows_count + delta * counts.c.past,
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+
+ROLLOVER = db.text('''
+    WITH moved AS (
+        UPDATE shows SET counted_past = true, updated_at = now()
+        WHERE NOT counted_past AND start_time <= now()
+        RETURNING venue_id, artist_id
+    ), venue_moves AS (
+        UPDATE venues
+        SET upcoming_shows_count = upcoming_shows_count - m.n,
+            past_shows_count = past_shows_count + m.n,
+            updated_at = now()
+        FROM (SELECT venue_id, count(*) AS n FROM moved GROUP BY venue_id) AS m
+        WHERE venues.id = m.venue_id
+    ), artist_moves AS (
+        UPDATE artists
+        SET upcoming_shows_count = upcoming_shows_count - m.n,
+            past_shows_count = past_shows_count + m.n,
+            updated_at = now()
+        FROM (SELECT artist_id, count(*) AS n FROM moved GROUP BY artist_id) AS m
+        WHERE artists.id = m.artist_id
+    )
+    SELECT count(*) FROM moved
+''')
+
+
+def rollover():
+    """Move shows that have started from upcoming to past; returns how many.
+
+    Runs as one statement, so it is atomic and safe to re-run at any
+    interval; only shows not yet rolled over are touched, found through
+    the ix_shows_pending_rollover partial index.
+    """
+    return db.session.execute(ROLLOVER).scalar()
+
+
+def check(fix=False):
+    """Recount every venue/artist from shows and return the mismatches.
+
+    Each mismatch is (table, id, stored, actual) with (upcoming, past)
+    pairs. With fix=True the stored counters are overwritten.
+    """
+    mismatches = []
+    for model, key in COUNTED:
+        actual = (
+            db.session.query(
+                key.label('id'),
+                db.func.count().filter(db.not_(Show.counted_past)).label('upcoming'),
+                db.func.count().filter(Show.counted_past).label('past'),
+            )
+            .group_by(key)
+            .subquery()
+        )
+        rows = (
+            db.session.query(
+                model.id,
+                model.upcoming_shows_count,
+                model.past_shows_count,
+                db.func.coalesce(actual.c.upcoming, 0),
+                db.func.coalesce(actual.c.past, 0),
+            )
+            .outerjoin(actual, actual.c.id == model.id)
+            .filter(db.or_(
+                model.upcoming_shows_count != db.func.coalesce(actual.c.upcoming, 0),
+                model.past_shows_count != db.func.coalesce(actual.c.past, 0),
+            ))
+            .all()
+        )
+        for entity_id, upcoming, past, actual_upcoming, actual_past in rows:
+            mismatches.append((model.__tablename__, entity_id,
+                               (upcoming, past), (actual_upcoming, actual_past)))
+            if fix:
+                db.session.execute(
+                    db.update(model)
+                    .where(model.id == entity_id)
+                    .values(upcoming_shows_count=actual_upcoming,
+                            past_shows_count=actual_past)
+                )
+    return mismatches
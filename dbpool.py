@@ -0,0 +1,68 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import threading
+import time
+
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import QueuePool
+
+#----------------------------------------------------------------------------#
+# Connection pool instrumentation.
+#----------------------------------------------------------------------------#
+
+
+class PoolStats:
+    """Checkout-wait counters shared by every pool in the process."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, waited, timed_out=False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    def snapshot(self, pool=None):
+        data = {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_seconds_total": self.wait_seconds,
+            "wait_seconds_max": self.max_wait_seconds,
+            "wait_seconds_avg": self.wait_seconds / self.checkouts if self.checkouts else 0.0,
+        }
+        if isinstance(pool, QueuePool):
+            capacity = pool.size() + pool._max_overflow
+            data.update({
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+                "max_overflow": pool._max_overflow,
+                "utilization": pool.checkedout() / capacity if capacity > 0 else 0.0,
+            })
+        return data
+
+
+stats = PoolStats()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except TimeoutError:
+            stats.record(time.perf_counter() - started, timed_out=True)
+            raise
+        stats.record(time.perf_counter() - started)
+        return connection
@@ -0,0 +1,65 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import csv
+import io
+import json
+
+from models import Venue, Artist, Show, db
+
+#----------------------------------------------------------------------------#
+# Streaming export.
+#----------------------------------------------------------------------------#
+
+MODELS = {'venues': Venue, 'artists': Artist, 'shows': Show}
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+def iter_rows(kind, since=None, batch_size=1000):
+    """Yield (columns, row) for every row of `kind` changed after `since`.
+
+    Rows are read through a server-side cursor in `batch_size` chunks, in
+    (updated_at, id) order, so memory stays flat whatever the table size
+    and an export can be resumed from the last updated_at it saw.
+    """
+    table = MODELS[kind].__table__
+    query = (
+        db.session.query(table)
+        .order_by(table.c.updated_at, table.c.id)
+        .execution_options(stream_results=True)
+        .yield_per(batch_size)
+    )
+    if since is not None:
+        query = query.filter(table.c.updated_at > since)
+    return table.columns.keys(), query
+
+
+def generate(kind, format, since=None, batch_size=1000):
+    """Yield the export as text chunks, one header/row at a time."""
+    columns, rows = iter_rows(kind, since, batch_size)
+    if format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        def line(values):
+            writer.writerow(values)
+            chunk = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            return chunk
+
+        yield line(columns)
+        for row in rows:
+            yield line(
+                ','.join(value) if isinstance(value, list) else
+                value.isoformat() if hasattr(value, 'isoformat') else value
+                for value in row)
+    else:
+        for row in rows:
+            yield json.dumps(dict(zip(columns, row)), default=_json_default) + '\n'
+
+
+def _json_default(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(repr(value))
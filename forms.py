@@ -1,8 +1,10 @@
-from datetime import datetime
+import calendar
+from datetime import datetime, timezone
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, ValidationError, TextAreaField
-from wtforms.validators import DataRequired, URL, Length, Optional, InputRequired, Regexp
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, ValidationError, TextAreaField, IntegerField, TimeField
+from wtforms.validators import DataRequired, URL, Length, Optional, InputRequired, Regexp, NumberRange
 import re
+from models import DEFAULT_SHOW_MINUTES
 
 
 # Constant Variables
@@ -85,6 +87,29 @@ state_options = [
             ('WY', 'WY'),
         ]
 
+# Form times
+#  ----------------------------------------------------------------
+
+def utc_datetime(moment):
+    """`moment` as an aware UTC datetime; one without an offset is UTC.
+
+    Times entered in forms are UTC, like the weekly availability windows.
+    Made aware here, they never reach the database as naive values, which
+    it would read in its session time zone.
+    """
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+
+class UTCDateTimeField(DateTimeField):
+    """DateTimeField whose data is an aware UTC datetime."""
+
+    def process_formdata(self, valuelist):
+        super().process_formdata(valuelist)
+        if self.data is not None:
+            self.data = utc_datetime(self.data)
+
 # Shows Form
 #  ----------------------------------------------------------------
 
@@ -95,11 +120,107 @@ class ShowForm(Form):
     venue_id = StringField(
         'venue_id', validators=[InputRequired()],
     )
-    start_time = DateTimeField(
+    # UTC
+    start_time = UTCDateTimeField(
         'start_time',
         validators=[InputRequired()],
-        default= datetime.today()
+        default=datetime.utcnow
+    )
+    # minutes
+    duration = IntegerField(
+        'duration',
+        validators=[Optional(), NumberRange(min=1, max=24 * 60)],
+        default=DEFAULT_SHOW_MINUTES
+    )
+
+# Tour Form
+#  ----------------------------------------------------------------
+
+MAX_TOUR_DATES = 100
+
+
+class TourForm(Form):
+    artist_id = StringField(
+        'artist_id', validators=[InputRequired()],
+    )
+    # one "venue_id, start_time" per line
+    dates = TextAreaField(
+        'dates', validators=[InputRequired()]
     )
+    # minutes, for every date
+    duration = IntegerField(
+        'duration',
+        validators=[Optional(), NumberRange(min=1, max=24 * 60)],
+        default=DEFAULT_SHOW_MINUTES
+    )
+
+    def validate_dates(self, field):
+        if len(self.tour_dates()) > MAX_TOUR_DATES:
+            raise ValidationError('A tour can have at most {} dates.'.format(MAX_TOUR_DATES))
+
+    def tour_dates(self):
+        """One dict per non-blank line, with 'errors' for lines that do not parse."""
+        dates = []
+        for line, text in enumerate((self.dates.data or '').splitlines(), start=1):
+            if not text.strip():
+                continue
+            date = {"line": line, "text": text.strip(), "venue_id": None,
+                    "start_time": None, "errors": []}
+            venue_id, _, start_time = text.partition(',')
+            if venue_id.strip().isdigit():
+                date['venue_id'] = int(venue_id)
+            else:
+                date['errors'].append('Expected a venue ID before the comma.')
+            try:
+                date['start_time'] = datetime.fromisoformat(start_time.strip())
+            except ValueError:
+                pass
+            # Like ShowForm, times are UTC and written without an offset.
+            if date['start_time'] is None or date['start_time'].tzinfo is not None:
+                date['start_time'] = None
+                date['errors'].append('Expected a start time like YYYY-MM-DD HH:MM.')
+            else:
+                date['start_time'] = utc_datetime(date['start_time'])
+            dates.append(date)
+        return dates
+
+# Availability Form
+#  ----------------------------------------------------------------
+
+class AvailabilityForm(Form):
+    kind = SelectField(
+        'kind', choices=[('weekly', 'Every week'), ('once', 'One-off')],
+        default='weekly'
+    )
+    # one-off, in UTC
+    starts_at = UTCDateTimeField('starts_at', validators=[Optional()])
+    ends_at = UTCDateTimeField('ends_at', validators=[Optional()])
+    # weekly, in UTC
+    weekday = SelectField(
+        'weekday', coerce=int, choices=list(enumerate(calendar.day_name)),
+        default=0
+    )
+    from_time = TimeField('from_time', validators=[Optional()])
+    to_time = TimeField('to_time', validators=[Optional()])
+
+    def validate(self, **kwargs):
+        if not super().validate(**kwargs):
+            return False
+        if self.kind.data == 'once':
+            if not self.starts_at.data or not self.ends_at.data:
+                self.starts_at.errors.append('A one-off window needs a start and an end.')
+                return False
+            if self.ends_at.data <= self.starts_at.data:
+                self.ends_at.errors.append('The end must be after the start.')
+                return False
+        else:
+            if not self.from_time.data or not self.to_time.data:
+                self.from_time.errors.append('A weekly window needs a from and a to time.')
+                return False
+            if self.from_time.data == self.to_time.data:
+                self.to_time.errors.append('The window must not be empty.')
+                return False
+        return True
 
 # Venues Form
 #  ----------------------------------------------------------------
@@ -188,7 +309,7 @@ class ArtistForm(Form):
             'seeking_description', validators=[Optional(), Length(max=500)]
      )
 
-    # Custom validation funtions
-    def validate_phone(form, field):
-        if not re.search(r"^[0-9]{3}-[0-9]{3}-[0-9]{4}$", field.data):
-            raise ValidationError("Invalid phone number.")
+    # # Custom validation funtions
+    # def validate_phone(form, field):
+    #     if not re.search(r"^[0-9]{3}-[0-9]{3}-[0-9]{4}$", field.data):
+    #         raise ValidationError("Invalid phone number.")
@@ -0,0 +1,215 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import csv
+import json
+import os
+import time
+from datetime import timedelta
+from itertools import islice
+
+from sqlalchemy.dialects.postgresql import insert
+from werkzeug.datastructures import MultiDict
+
+import counters
+import queries
+from forms import VenueForm, ArtistForm, ShowForm
+from models import Venue, Artist, Show, db, DEFAULT_SHOW_MINUTES
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#----------------------------------------------------------------------------#
+
+# kind -> (model, form used for validation, columns copied from the form)
+KINDS = {
+    'venues': (Venue, VenueForm, (
+        'name', 'city', 'state', 'address', 'phone', 'genres', 'image_link',
+        'facebook_link', 'website_link', 'seeking_talent', 'seeking_description')),
+    'artists': (Artist, ArtistForm, (
+        'name', 'city', 'state', 'phone', 'genres', 'image_link',
+        'facebook_link', 'website_link', 'seeking_venue', 'seeking_description')),
+    'shows': (Show, ShowForm, ('artist_id', 'venue_id', 'start_time', 'duration')),
+}
+
+MULTI_VALUED = ('genres',)
+BOOLEAN = ('seeking_talent', 'seeking_venue')
+
+
+def read_rows(path, format=None):
+    """Stream dict rows from a CSV (with header) or NDJSON file."""
+    format = format or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+    with open(path, newline='', encoding='utf-8') as source:
+        if format == 'csv':
+            yield from csv.DictReader(source)
+        else:
+            for line in source:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def to_formdata(row):
+    """Map one input row onto the formdata the web forms would receive."""
+    formdata = MultiDict()
+    for key, value in row.items():
+        if value is None or value is False:
+            continue
+        if key in MULTI_VALUED:
+            values = value if isinstance(value, list) else value.split(',')
+            for item in values:
+                if item.strip():
+                    formdata.add(key, item.strip())
+        elif key in BOOLEAN:
+            if str(value).strip().lower() not in ('', 'false', 'no', 'n', '0'):
+                formdata.add(key, 'y')
+        else:
+            formdata.add(key, str(value))
+    return formdata
+
+
+class Importer:
+    """Validate rows with the app's forms and insert them in batches.
+
+    Progress is checkpointed after every committed batch, in input-row
+    numbers, to `<path>.checkpoint`; rejected rows and their form errors
+    are appended to `<path>.rejected.ndjson`.
+    """
+
+    def __init__(self, kind, path, format=None, batch_size=1000, report=print):
+        self.model, self.form_class, self.columns = KINDS[kind]
+        self.path = path
+        self.format = format
+        self.batch_size = batch_size
+        self.report = report
+        self.checkpoint_path = path + '.checkpoint'
+        self.rejected_path = path + '.rejected.ndjson'
+        self.read = self.inserted = self.rejected = self.skipped = 0
+
+    def run(self, resume=False):
+        start = self.load_checkpoint() if resume else 0
+        rows = enumerate(read_rows(self.path, self.format), start=1)
+        if start:
+            self.report('Resuming after row {}.'.format(start))
+            rows = islice(rows, start, None)
+        self.read = start
+
+        started = time.monotonic()
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            self.import_batch(batch)
+            elapsed = time.monotonic() - started
+            self.report('{} rows read, {} inserted, {} rejected, {} skipped ({:.0f} rows/s)'.format(
+                self.read, self.inserted, self.rejected, self.skipped,
+                (self.read - start) / elapsed if elapsed else 0))
+
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+        return self
+
+    def import_batch(self, batch):
+        records, rejects = [], []
+        for line, row in batch:
+            form = self.form_class(formdata=to_formdata(row))
+            if form.validate():
+                records.append((line, {column: form[column].data for column in self.columns}))
+            else:
+                rejects.append({"row": line, "errors": form.errors, "data": row})
+
+        if self.model is Show:
+            records = self.resolve_references(records, rejects)
+
+        inserted = self.insert([record for _, record in records])
+        db.session.commit()
+
+        self.read = batch[-1][0]
+        self.inserted += inserted
+        self.skipped += len(records) - inserted
+        self.rejected += len(rejects)
+        self.save_checkpoint(rejects)
+
+    def resolve_references(self, records, rejects):
+        """Reject shows whose venue or artist does not exist, one query per side."""
+        for _, record in records:
+            for key in ('venue_id', 'artist_id'):
+                record[key] = int(record[key]) if record[key].strip().isdigit() else None
+            record['end_time'] = record['start_time'] + timedelta(minutes=record.pop('duration') or DEFAULT_SHOW_MINUTES)
+        venue_ids = {record['venue_id'] for _, record in records}
+        artist_ids = {record['artist_id'] for _, record in records}
+        venues = {id for (id,) in db.session.query(Venue.id).filter(Venue.id.in_(venue_ids))}
+        artists = {id for (id,) in db.session.query(Artist.id).filter(Artist.id.in_(artist_ids))}
+
+        resolved = []
+        for line, record in records:
+            errors = {}
+            if record['venue_id'] not in venues:
+                errors['venue_id'] = ['Unknown venue.']
+            if record['artist_id'] not in artists:
+                errors['artist_id'] = ['Unknown artist.']
+            if errors:
+                rejects.append({"row": line, "errors": errors, "data": record})
+            else:
+                resolved.append((line, record))
+        return resolved
+
+    def insert(self, records):
+        """executemany() the batch; returns how many rows were inserted."""
+        if not records:
+            return 0
+        if self.model is not Show:
+            db.session.execute(insert(self.model), records)
+            return len(records)
+
+        # Shows take pre-allocated ids so the new rows can be counted in
+        # bulk; rows overlapping an existing booking, or an earlier row of
+        # the batch, are skipped. The overlap constraints only compare
+        # shows within a month, so the check is made here, with every
+        # other booking held off until the batch commits.
+        queries.lock_all_bookings()
+        records = self.without_conflicts(records)
+        if not records:
+            return 0
+        ids = db.session.execute(
+            db.text("SELECT nextval(pg_get_serial_sequence('shows', 'id')) "
+                    "FROM generate_series(1, :n)"),
+            {"n": len(records)}).scalars().all()
+        for id, record in zip(ids, records):
+            record['id'] = id
+        db.session.execute(insert(Show).on_conflict_do_nothing(), records)
+        counters.shows_added(ids)
+        return db.session.query(db.func.count(Show.id)).filter(Show.id.in_(ids)).scalar()
+
+    def without_conflicts(self, records):
+        """Drop the shows overlapping a booked show or an earlier one of `records`."""
+        clashing = {conflict.line for conflict in queries.batch_conflicts([
+            (line, record['venue_id'], record['artist_id'], record['start_time'], record['end_time'])
+            for line, record in enumerate(records)])}
+        # Earliest first: a kept show overlaps the next one iff it ends after
+        # that one starts.
+        booked_until = {}
+        kept = []
+        for line in sorted(range(len(records)), key=lambda line: records[line]['start_time']):
+            record = records[line]
+            keys = (('venue', record['venue_id']), ('artist', record['artist_id']))
+            if line in clashing or any(booked_until.get(key, record['start_time']) > record['start_time']
+                                       for key in keys):
+                continue
+            for key in keys:
+                booked_until[key] = record['end_time']
+            kept.append(line)
+        return [records[line] for line in sorted(kept)]
+
+    def load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            return 0
+        with open(self.checkpoint_path) as checkpoint:
+            return int(checkpoint.read().strip() or 0)
+
+    def save_checkpoint(self, rejects):
+        if rejects:
+            with open(self.rejected_path, 'a', encoding='utf-8') as rejected:
+                for reject in rejects:
+                    rejected.write(json.dumps(reject, default=str) + '\n')
+        with open(self.checkpoint_path + '.tmp', 'w') as checkpoint:
+            checkpoint.write(str(self.read))
+        os.replace(self.checkpoint_path + '.tmp', self.checkpoint_path)
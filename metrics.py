@@ -0,0 +1,289 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+import jinja2
+from flask import g, request
+
+import dbpool
+from cache import cache
+from models import db
+
+#----------------------------------------------------------------------------#
+# Prometheus metrics.
+#----------------------------------------------------------------------------#
+
+# Each thread records into its own shard, so the request path takes no
+# lock; shards are only summed when /metrics is scraped. Under a
+# multi-process server set METRICS_DIR (wiped on deploy) and every worker
+# also publishes its totals there every METRICS_FLUSH_SECONDS, so whichever
+# worker answers the scrape reports all of them.
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Shard:
+    def __init__(self):
+        # (endpoint, method, status) -> per-bucket counts + [sum]
+        self.requests = {}
+        # endpoint -> seconds
+        self.db_seconds = {}
+        self.template_seconds = {}
+
+
+class Registry:
+    def __init__(self):
+        self._shards = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = Shard()
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def observe(self, endpoint, method, status, seconds, db_seconds, template_seconds):
+        shard = self.shard()
+        key = (endpoint, method, str(status))
+        histogram = shard.requests.get(key)
+        if histogram is None:
+            histogram = shard.requests[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+        histogram[bisect_left(BUCKETS, seconds)] += 1
+        histogram[-1] += seconds
+        shard.db_seconds[endpoint] = shard.db_seconds.get(endpoint, 0.0) + db_seconds
+        shard.template_seconds[endpoint] = (
+            shard.template_seconds.get(endpoint, 0.0) + template_seconds)
+
+    def totals(self):
+        """This process's counters summed over its shards, JSON-friendly."""
+        requests, db_seconds, template_seconds = {}, {}, {}
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for key, histogram in list(shard.requests.items()):
+                _add(requests, '\t'.join(key), list(histogram))
+            for endpoint, seconds in list(shard.db_seconds.items()):
+                _add(db_seconds, endpoint, seconds)
+            for endpoint, seconds in list(shard.template_seconds.items()):
+                _add(template_seconds, endpoint, seconds)
+        return {'requests': requests, 'db_seconds': db_seconds,
+                'template_seconds': template_seconds}
+
+
+def _add(totals, key, value):
+    if key not in totals:
+        totals[key] = value
+    elif isinstance(value, list):
+        totals[key] = [a + b for a, b in zip(totals[key], value)]
+    else:
+        totals[key] += value
+
+
+registry = Registry()
+
+
+class TimedTemplate(jinja2.Template):
+    """Template that adds its render time to the current request."""
+
+    def render(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            if 'template_seconds' in g:
+                g.template_seconds += time.perf_counter() - started
+
+#----------------------------------------------------------------------------#
+# Process snapshots.
+#----------------------------------------------------------------------------#
+
+
+def snapshot(app):
+    """Counters and gauges of this process."""
+    pools = {}
+    for bind in [None] + list(app.config.get('SQLALCHEMY_BINDS') or {}):
+        pool = db.get_engine(app, bind=bind).pool
+        pools[bind or 'primary'] = dbpool.stats.snapshot(pool)
+
+    data = registry.totals()
+    data.update({
+        'pid': os.getpid(),
+        'pool_stats': dbpool.stats.snapshot(),
+        'pools': pools,
+        'cache': cache.stats(),
+    })
+    return data
+
+
+def publish(app):
+    """Write this process's snapshot into METRICS_DIR."""
+    path = os.path.join(app.config['METRICS_DIR'], 'metrics-{}.json'.format(os.getpid()))
+    with open(path + '.tmp', 'w') as file:
+        json.dump(snapshot(app), file)
+    os.replace(path + '.tmp', path)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def collect(app):
+    """Snapshots of every worker: live ones, plus counters of exited ones."""
+    own = snapshot(app)
+    if not app.config['METRICS_DIR']:
+        return [own]
+
+    snapshots = [own]
+    for path in glob.glob(os.path.join(app.config['METRICS_DIR'], 'metrics-*.json')):
+        try:
+            with open(path) as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            continue
+        if data['pid'] == own['pid']:
+            continue
+        if not _alive(data['pid']):
+            # Keep counting what it served, but its gauges are gone.
+            data['pools'] = {}
+            data['cache'].pop('entries', None)
+        snapshots.append(data)
+    return snapshots
+
+#----------------------------------------------------------------------------#
+# Exposition.
+#----------------------------------------------------------------------------#
+
+
+def _labels(**labels):
+    return '{' + ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in labels.items()) + '}'
+
+
+def _family(lines, name, kind, help):
+    lines.append('# HELP {} {}'.format(name, help))
+    lines.append('# TYPE {} {}'.format(name, kind))
+
+
+def render(snapshots):
+    """Prometheus text format for the sum of `snapshots`."""
+    requests, db_seconds, template_seconds = {}, {}, {}
+    pools, pool_stats, cache_stats = {}, {}, {}
+    for data in snapshots:
+        for key, histogram in data['requests'].items():
+            _add(requests, key, histogram)
+        for endpoint, seconds in data['db_seconds'].items():
+            _add(db_seconds, endpoint, seconds)
+        for endpoint, seconds in data['template_seconds'].items():
+            _add(template_seconds, endpoint, seconds)
+        for bind, stats in data['pools'].items():
+            for name in ('size', 'checked_out', 'overflow'):
+                if name in stats:
+                    _add(pools, (bind, name), stats[name])
+        for name in ('checkouts', 'timeouts', 'wait_seconds_total'):
+            _add(pool_stats, name, data['pool_stats'][name])
+        for name in ('hits', 'misses', 'evictions', 'entries'):
+            if data['cache'].get(name) is not None:
+                _add(cache_stats, name, data['cache'][name])
+
+    lines = []
+    _family(lines, 'fyyur_request_duration_seconds', 'histogram',
+            'Request latency by endpoint, method and status.')
+    for key, histogram in sorted(requests.items()):
+        endpoint, method, status = key.split('\t')
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), histogram):
+            cumulative += count
+            lines.append('fyyur_request_duration_seconds_bucket{} {}'.format(
+                _labels(endpoint=endpoint, method=method, status=status, le=bound), cumulative))
+        labels = _labels(endpoint=endpoint, method=method, status=status)
+        lines.append('fyyur_request_duration_seconds_sum{} {}'.format(labels, histogram[-1]))
+        lines.append('fyyur_request_duration_seconds_count{} {}'.format(labels, cumulative))
+
+    _family(lines, 'fyyur_request_db_seconds_total', 'counter',
+            'Time spent in SQL statements, by endpoint.')
+    for endpoint, seconds in sorted(db_seconds.items()):
+        lines.append('fyyur_request_db_seconds_total{} {}'.format(
+            _labels(endpoint=endpoint), seconds))
+
+    _family(lines, 'fyyur_request_template_seconds_total', 'counter',
+            'Time spent rendering templates, by endpoint.')
+    for endpoint, seconds in sorted(template_seconds.items()):
+        lines.append('fyyur_request_template_seconds_total{} {}'.format(
+            _labels(endpoint=endpoint), seconds))
+
+    for name, help in (('size', 'Connections kept open by the pool.'),
+                       ('checked_out', 'Connections currently checked out.'),
+                       ('overflow', 'Connections open beyond the pool size.')):
+        _family(lines, 'fyyur_db_pool_' + name, 'gauge', help)
+        for (bind, stat), value in sorted(pools.items()):
+            if stat == name:
+                lines.append('fyyur_db_pool_{}{} {}'.format(name, _labels(bind=bind), value))
+
+    _family(lines, 'fyyur_db_pool_checkouts_total', 'counter', 'Successful pool checkouts.')
+    lines.append('fyyur_db_pool_checkouts_total {}'.format(pool_stats.get('checkouts', 0)))
+    _family(lines, 'fyyur_db_pool_timeouts_total', 'counter', 'Pool checkouts that timed out.')
+    lines.append('fyyur_db_pool_timeouts_total {}'.format(pool_stats.get('timeouts', 0)))
+    _family(lines, 'fyyur_db_pool_wait_seconds_total', 'counter', 'Time spent waiting for a connection.')
+    lines.append('fyyur_db_pool_wait_seconds_total {}'.format(pool_stats.get('wait_seconds_total', 0.0)))
+
+    for name in ('hits', 'misses', 'evictions'):
+        _family(lines, 'fyyur_cache_{}_total'.format(name), 'counter', 'Response data cache {}.'.format(name))
+        lines.append('fyyur_cache_{}_total {}'.format(name, cache_stats.get(name, 0)))
+    lookups = cache_stats.get('hits', 0) + cache_stats.get('misses', 0)
+    _family(lines, 'fyyur_cache_hit_ratio', 'gauge', 'Cache hits over lookups since start.')
+    lines.append('fyyur_cache_hit_ratio {}'.format(
+        cache_stats.get('hits', 0) / lookups if lookups else 0.0))
+    if 'entries' in cache_stats:
+        _family(lines, 'fyyur_cache_entries', 'gauge', 'Entries held by per-process caches.')
+        lines.append('fyyur_cache_entries {}'.format(cache_stats['entries']))
+
+    return '\n'.join(lines) + '\n'
+
+#----------------------------------------------------------------------------#
+# Flask integration.
+#----------------------------------------------------------------------------#
+
+
+def init_app(app):
+    app.config.setdefault('METRICS_DIR', None)
+    app.config.setdefault('METRICS_FLUSH_SECONDS', 5)
+    app.jinja_env.template_class = TimedTemplate
+    flushed_at = [0.0]
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+        g.template_seconds = 0.0
+
+    @app.after_request
+    def record_request(response):
+        if 'request_started' not in g:
+            return response
+        stats = g.get('query_stats')
+        registry.observe(
+            request.endpoint or 'unmatched', request.method, response.status_code,
+            time.perf_counter() - g.request_started,
+            stats.seconds if stats is not None else 0.0,
+            g.template_seconds)
+
+        now = time.monotonic()
+        if app.config['METRICS_DIR'] and now - flushed_at[0] >= app.config['METRICS_FLUSH_SECONDS']:
+            flushed_at[0] = now
+            publish(app)
+        return response
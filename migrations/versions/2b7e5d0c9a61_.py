@@ -0,0 +1,33 @@
+"""add (state, lower(city)) indexes on venues and artists
+
+They back the "City, ST" location search. Built concurrently.
+
+Revision ID: 2b7e5d0c9a61
+Revises: 8c4d2a9e7f13
+Create Date: 2026-10-18 20:02:33.640158
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2b7e5d0c9a61'
+down_revision = '8c4d2a9e7f13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for table in ('venues', 'artists'):
+            op.create_index('ix_{}_state_lower_city'.format(table), table,
+                            ['state', sa.text('lower(city)')],
+                            postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for table in ('artists', 'venues'):
+            op.drop_index('ix_{}_state_lower_city'.format(table), table_name=table,
+                          postgresql_concurrently=True)
@@ -0,0 +1,28 @@
+"""add updated_at to venues, artists and shows
+
+Revision ID: 4a4beb8ac118
+Revises: a74643c2a530
+Create Date: 2026-10-18 12:40:09.118356
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4a4beb8ac118'
+down_revision = 'a74643c2a530'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('venues', 'artists', 'shows'):
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False))
+        op.create_index(op.f('ix_{}_updated_at'.format(table)), table, ['updated_at'], unique=False)
+
+
+def downgrade():
+    for table in ('shows', 'artists', 'venues'):
+        op.drop_index(op.f('ix_{}_updated_at'.format(table)), table_name=table)
+        op.drop_column(table, 'updated_at')
@@ -0,0 +1,38 @@
+"""add search indexes on venues and artists
+
+Revision ID: 59188bc2af90
+Revises: 399b1951d0e5
+Create Date: 2026-10-18 09:12:44.318207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '59188bc2af90'
+down_revision = '399b1951d0e5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in ('venues', 'artists'):
+        for column in ('name', 'city', 'state'):
+            op.create_index(
+                'ix_{}_{}_trgm'.format(table, column), table, [column],
+                postgresql_using='gin',
+                postgresql_ops={column: 'gin_trgm_ops'})
+        op.create_index(
+            'ix_{}_name_tsv'.format(table), table,
+            [sa.text("to_tsvector('simple', coalesce(name, ''))")],
+            postgresql_using='gin')
+
+
+def downgrade():
+    for table in ('artists', 'venues'):
+        op.drop_index('ix_{}_name_tsv'.format(table), table_name=table)
+        for column in ('state', 'city', 'name'):
+            op.drop_index('ix_{}_{}_trgm'.format(table, column), table_name=table)
+    # pg_trgm is left installed; other objects may depend on it.
@@ -0,0 +1,50 @@
+"""add shows.end_time and per-venue/per-artist overlap exclusion constraints
+
+Existing shows get the default two-hour length. The exclusion constraints
+need the btree_gist extension for the integer '=' part, and replace the
+exact-duplicate unique constraint, which they subsume. Existing
+overlapping bookings must be resolved first or the constraints will fail
+to build; adding them locks shows against writes while the indexes build.
+
+Revision ID: 5f9a3c1e8b24
+Revises: 2b7e5d0c9a61
+Create Date: 2026-10-18 20:21:12.384406
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '5f9a3c1e8b24'
+down_revision = '2b7e5d0c9a61'
+branch_labels = None
+depends_on = None
+
+
+def booked_span():
+    return sa.func.tstzrange(sa.literal_column('start_time'), sa.literal_column('end_time'))
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    op.add_column('shows', sa.Column('end_time', sa.DateTime(timezone=True), nullable=True))
+    op.execute("UPDATE shows SET end_time = start_time + interval '120 minutes'")
+    op.alter_column('shows', 'end_time', nullable=False)
+
+    op.create_exclude_constraint('ex_shows_venue_overlap', 'shows',
+                                 ('venue_id', '='), (booked_span(), '&&'),
+                                 using='gist')
+    op.create_exclude_constraint('ex_shows_artist_overlap', 'shows',
+                                 ('artist_id', '='), (booked_span(), '&&'),
+                                 using='gist')
+    op.drop_constraint('uq_shows_venue_id_artist_id_start_time', 'shows', type_='unique')
+
+
+def downgrade():
+    op.create_unique_constraint('uq_shows_venue_id_artist_id_start_time', 'shows',
+                                ['venue_id', 'artist_id', 'start_time'])
+    op.drop_constraint('ex_shows_artist_overlap', 'shows')
+    op.drop_constraint('ex_shows_venue_overlap', 'shows')
+    op.drop_column('shows', 'end_time')
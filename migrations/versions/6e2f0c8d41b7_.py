@@ -0,0 +1,46 @@
+"""repair comma-joined genres and add GIN indexes on genres
+
+The create handlers used to pass ",".join(genres) to the ARRAY column,
+which SQLAlchemy stored one character per element ('Jazz,Blues' became
+{J,a,z,z,",",B,...}). Rows whose elements are all single characters are
+glued back together and split on commas. The GIN indexes serve the @>
+and && genre filters and are built concurrently.
+
+Revision ID: 6e2f0c8d41b7
+Revises: b9ce116e3f09
+Create Date: 2026-10-18 19:21:40.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6e2f0c8d41b7'
+down_revision = 'b9ce116e3f09'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('venues', 'artists'):
+        op.execute(
+            'UPDATE {0} SET genres = string_to_array(array_to_string(genres, \'\'), \',\') '
+            'WHERE cardinality(genres) > 1 '
+            'AND NOT EXISTS (SELECT 1 FROM unnest({0}.genres) AS genre '
+            'WHERE length(genre) <> 1)'.format(table))
+    with op.get_context().autocommit_block():
+        op.create_index('ix_venues_genres', 'venues', ['genres'],
+                        postgresql_using='gin',
+                        postgresql_concurrently=True)
+        op.create_index('ix_artists_genres', 'artists', ['genres'],
+                        postgresql_using='gin',
+                        postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_artists_genres', table_name='artists',
+                      postgresql_concurrently=True)
+        op.drop_index('ix_venues_genres', table_name='venues',
+                      postgresql_concurrently=True)
@@ -0,0 +1,34 @@
+"""add (created_at DESC, id DESC) indexes on venues and artists
+
+They back the home page's recently listed feeds, which read the top ten
+entries and stop. Built concurrently.
+
+Revision ID: 8c4d2a9e7f13
+Revises: 6e2f0c8d41b7
+Create Date: 2026-10-18 19:48:05.113927
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c4d2a9e7f13'
+down_revision = '6e2f0c8d41b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for table in ('venues', 'artists'):
+            op.create_index('ix_{}_created_at_id'.format(table), table,
+                            [sa.text('created_at DESC'), sa.text('id DESC')],
+                            postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for table in ('artists', 'venues'):
+            op.drop_index('ix_{}_created_at_id'.format(table), table_name=table,
+                          postgresql_concurrently=True)
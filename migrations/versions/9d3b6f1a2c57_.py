@@ -0,0 +1,50 @@
+"""add availabilities: one-off and weekly booking windows per artist
+
+Weekly windows are stored as minutes since Monday 00:00 UTC. Both range
+columns get GiST indexes for the containment (@>) lookups done when a
+show is booked.
+
+Revision ID: 9d3b6f1a2c57
+Revises: 5f9a3c1e8b24
+Create Date: 2026-10-18 21:02:47.115230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '9d3b6f1a2c57'
+down_revision = '5f9a3c1e8b24'
+branch_labels = None
+depends_on = None
+
+WEEK_MINUTES = 7 * 24 * 60
+
+
+def upgrade():
+    op.create_table('availabilities',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('period', postgresql.TSTZRANGE(), nullable=True),
+    sa.Column('weekly', postgresql.INT4RANGE(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.CheckConstraint('(period IS NULL) <> (weekly IS NULL)', name='ck_availabilities_one_kind'),
+    sa.CheckConstraint(
+        'weekly IS NULL OR (lower(weekly) >= 0 AND lower(weekly) < {0} '
+        'AND upper(weekly) - lower(weekly) <= {0})'.format(WEEK_MINUTES),
+        name='ck_availabilities_weekly_bounds'),
+    sa.ForeignKeyConstraint(['artist_id'], ['artists.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_availabilities_artist_id'), 'availabilities', ['artist_id'], unique=False)
+    op.create_index('ix_availabilities_period', 'availabilities', ['period'], unique=False, postgresql_using='gist')
+    op.create_index('ix_availabilities_weekly', 'availabilities', ['weekly'], unique=False, postgresql_using='gist')
+
+
+def downgrade():
+    op.drop_index('ix_availabilities_weekly', table_name='availabilities')
+    op.drop_index('ix_availabilities_period', table_name='availabilities')
+    op.drop_index(op.f('ix_availabilities_artist_id'), table_name='availabilities')
+    op.drop_table('availabilities')
@@ -0,0 +1,46 @@
+"""add denormalized upcoming/past show counters
+
+Revision ID: a74643c2a530
+Revises: d03bc4ba34d9
+Create Date: 2026-10-18 11:24:51.660173
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a74643c2a530'
+down_revision = 'd03bc4ba34d9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('venues', 'artists'):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('shows', sa.Column('counted_past', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+    # Backfill: bucket every existing show, then count the buckets.
+    op.execute('UPDATE shows SET counted_past = start_time <= now()')
+    for table, key in (('venues', 'venue_id'), ('artists', 'artist_id')):
+        op.execute(
+            'UPDATE {table} SET '
+            'upcoming_shows_count = c.upcoming, past_shows_count = c.past '
+            'FROM (SELECT {key}, '
+            'count(*) FILTER (WHERE NOT counted_past) AS upcoming, '
+            'count(*) FILTER (WHERE counted_past) AS past '
+            'FROM shows GROUP BY {key}) AS c '
+            'WHERE {table}.id = c.{key}'.format(table=table, key=key))
+
+    op.create_index('ix_shows_pending_rollover', 'shows', ['start_time'],
+                    postgresql_where=sa.text('NOT counted_past'))
+
+
+def downgrade():
+    op.drop_index('ix_shows_pending_rollover', table_name='shows')
+    op.drop_column('shows', 'counted_past')
+    for table in ('artists', 'venues'):
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
@@ -0,0 +1,28 @@
+"""add created_at to venues, artists and shows
+
+Revision ID: b9ce116e3f09
+Revises: 4a4beb8ac118
+Create Date: 2026-10-18 13:31:52.227940
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b9ce116e3f09'
+down_revision = '4a4beb8ac118'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('venues', 'artists', 'shows'):
+        op.add_column(table, sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False))
+        # Existing rows have no better creation time than their last update.
+        op.execute('UPDATE {} SET created_at = updated_at'.format(table))
+
+
+def downgrade():
+    for table in ('shows', 'artists', 'venues'):
+        op.drop_column(table, 'created_at')
@@ -0,0 +1,155 @@
+"""partition shows by month on start_time
+
+shows becomes a range-partitioned table. The existing table is attached
+as it is, as the partition for every show before the month after the
+latest one (shows_before_y2026m11 say); monthly partitions follow up to
+three months ahead, plus a DEFAULT partition, and `flask shows
+partitions` maintains them from then on. The overlap exclusion
+constraints live on each partition (PostgreSQL does not allow them on
+the partitioned table), and the primary key becomes (id, start_time)
+since it has to include the partition key.
+
+No row is copied. The unique (id, start_time) index and a CHECK
+constraint matching the partition bound, which lets ATTACH skip its
+scan, are first built CONCURRENTLY and validated while shows stays
+writable; only a booking starting after the bound is refused meanwhile.
+Writes are then blocked for the last transaction alone: catalog changes
+taking milliseconds whatever the number of rows, after waiting at most
+lock_timeout (5s) for the queries running on shows.
+
+The downgrade copies every row back into one table, and blocks writes to
+shows for as long as the copy takes.
+
+Revision ID: c4e7a2b9d061
+Revises: 9d3b6f1a2c57
+Create Date: 2026-10-18 22:36:05.417882
+
+"""
+from datetime import date, datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e7a2b9d061'
+down_revision = '9d3b6f1a2c57'
+branch_labels = None
+depends_on = None
+
+COLUMNS = 'id, artist_id, venue_id, start_time, end_time, counted_past, created_at, updated_at'
+
+# Indexes of shows, as (name, columns, where).
+INDEXES = [
+    ('ix_shows_venue_id_start_time', ['venue_id', 'start_time'], None),
+    ('ix_shows_artist_id_start_time', ['artist_id', 'start_time'], None),
+    ('ix_shows_start_time_id', ['start_time', 'id'], None),
+    ('ix_shows_pending_rollover', ['start_time'], 'NOT counted_past'),
+    ('ix_shows_updated_at', ['updated_at'], None),
+]
+
+
+def overlap_constraints(table, suffix=None):
+    # The overlap exclusion constraints of 5f9a3c1e8b24, one pair per partition.
+    return [
+        'ALTER TABLE {0} ADD CONSTRAINT ex_shows_{1}_overlap{2} '
+        'EXCLUDE USING gist ({1}_id WITH =, tstzrange(start_time, end_time) WITH &&)'.format(
+            table, side, '_' + suffix if suffix else '')
+        for side in ('venue', 'artist')
+    ]
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def bound(month):
+    return "'{}'".format(datetime(month.year, month.month, 1, tzinfo=timezone.utc).isoformat())
+
+
+def create_shows_table(name, partitioned):
+    op.execute(
+        'CREATE TABLE {} ('
+        'id integer NOT NULL, '
+        'artist_id integer NOT NULL, '
+        'venue_id integer NOT NULL, '
+        'start_time timestamp with time zone NOT NULL, '
+        'end_time timestamp with time zone NOT NULL, '
+        'counted_past boolean DEFAULT false NOT NULL, '
+        'created_at timestamp with time zone DEFAULT now() NOT NULL, '
+        'updated_at timestamp with time zone DEFAULT now() NOT NULL'
+        '){}'.format(name, ' PARTITION BY RANGE (start_time)' if partitioned else ''))
+
+
+def finish_shows_table(primary_key):
+    op.execute('ALTER TABLE shows ALTER COLUMN id SET DEFAULT nextval(\'shows_id_seq\')')
+    op.execute('ALTER SEQUENCE shows_id_seq OWNED BY shows.id')
+    op.create_primary_key('shows_pkey', 'shows', primary_key)
+    op.create_foreign_key('shows_artist_id_fkey', 'shows', 'artists', ['artist_id'], ['id'])
+    op.create_foreign_key('shows_venue_id_fkey', 'shows', 'venues', ['venue_id'], ['id'])
+    for name, columns, where in INDEXES:
+        op.create_index(name, 'shows', columns,
+                        postgresql_where=sa.text(where) if where else None)
+
+
+def upgrade():
+    last = op.get_bind().execute(sa.text(
+        "SELECT max(start_time AT TIME ZONE 'UTC') FROM shows")).scalar()
+    this_month = datetime.now(timezone.utc).date().replace(day=1)
+    upper = add_months(max(last.date().replace(day=1) if last else this_month, this_month), 1)
+    legacy = 'shows_before_y{0:%Y}m{0:%m}'.format(upper)
+
+    # While shows stays writable.
+    with op.get_context().autocommit_block():
+        op.create_index(legacy + '_pkey', 'shows', ['id', 'start_time'], unique=True,
+                        postgresql_concurrently=True)
+        op.execute('ALTER TABLE shows ADD CONSTRAINT {}_bound CHECK (start_time < {}) NOT VALID'.format(
+            legacy, bound(upper)))
+        op.execute('ALTER TABLE shows VALIDATE CONSTRAINT {}_bound'.format(legacy))
+
+    # Catalog changes only from here on. The partitioned table is complete
+    # before the old one is attached, so ATTACH adopts its primary key,
+    # foreign keys and indexes instead of building new ones.
+    op.execute("SET LOCAL lock_timeout = '5s'")
+    op.execute('ALTER TABLE shows RENAME TO {}'.format(legacy))
+    op.execute('ALTER TABLE {0} DROP CONSTRAINT shows_pkey, '
+               'ADD CONSTRAINT {0}_pkey PRIMARY KEY USING INDEX {0}_pkey'.format(legacy))
+    for name, _, _ in INDEXES:
+        op.execute('ALTER INDEX {} RENAME TO {}_{}_idx'.format(name, legacy, name[len('ix_shows_'):]))
+    for side in ('venue', 'artist'):
+        op.execute('ALTER TABLE {0} RENAME CONSTRAINT ex_shows_{1}_overlap TO ex_shows_{1}_overlap_{2}'.format(
+            legacy, side, legacy[len('shows_'):]))
+
+    create_shows_table('shows', partitioned=True)
+    finish_shows_table(['id', 'start_time'])
+    op.execute('CREATE TABLE shows_default PARTITION OF shows DEFAULT')
+    op.execute('ALTER TABLE shows ATTACH PARTITION {} FOR VALUES FROM (MINVALUE) TO ({})'.format(
+        legacy, bound(upper)))
+    # The partition bound enforces it from now on.
+    op.execute('ALTER TABLE {0} DROP CONSTRAINT {0}_bound'.format(legacy))
+
+    partitions = ['shows_default']
+    month = upper
+    while month <= add_months(this_month, 3):
+        name = 'shows_y{0:%Y}m{0:%m}'.format(month)
+        op.execute('CREATE TABLE {} PARTITION OF shows FOR VALUES FROM ({}) TO ({})'.format(
+            name, bound(month), bound(add_months(month, 1))))
+        partitions.append(name)
+        month = add_months(month, 1)
+    for name in partitions:
+        for statement in overlap_constraints(name, name[len('shows_'):]):
+            op.execute(statement)
+
+
+def downgrade():
+    # Partitions already moved to the archive schema are left there.
+    create_shows_table('shows_unpartitioned', partitioned=False)
+    # The id sequence would go with the old table.
+    op.execute("ALTER SEQUENCE shows_id_seq OWNED BY NONE")
+    op.execute('INSERT INTO shows_unpartitioned ({columns}) SELECT {columns} FROM shows'.format(columns=COLUMNS))
+    op.execute('DROP TABLE shows')
+    op.execute('ALTER TABLE shows_unpartitioned RENAME TO shows')
+    finish_shows_table(['id'])
+    for statement in overlap_constraints('shows'):
+        op.execute(statement)
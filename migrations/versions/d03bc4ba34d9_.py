@@ -0,0 +1,59 @@
+"""add shows composite indexes and unique booking constraint
+
+Indexes are built with CREATE INDEX CONCURRENTLY outside the migration
+transaction so the tables stay writable while they build. The unique
+constraint is attached to its pre-built index afterwards, which only
+takes a brief lock. Existing duplicate (venue_id, artist_id, start_time)
+rows must be removed first or the unique index build will fail.
+
+Revision ID: d03bc4ba34d9
+Revises: 59188bc2af90
+Create Date: 2026-10-18 10:02:17.904512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd03bc4ba34d9'
+down_revision = '59188bc2af90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('ix_shows_venue_id_start_time', 'shows',
+                        ['venue_id', 'start_time'],
+                        postgresql_concurrently=True)
+        op.create_index('ix_shows_artist_id_start_time', 'shows',
+                        ['artist_id', 'start_time'],
+                        postgresql_concurrently=True)
+        op.create_index('ix_shows_start_time_id', 'shows',
+                        ['start_time', 'id'],
+                        postgresql_concurrently=True)
+        op.create_index('ix_venues_state_city', 'venues',
+                        ['state', 'city'],
+                        postgresql_concurrently=True)
+        op.create_index('uq_shows_venue_id_artist_id_start_time', 'shows',
+                        ['venue_id', 'artist_id', 'start_time'],
+                        unique=True,
+                        postgresql_concurrently=True)
+    op.execute(
+        'ALTER TABLE shows ADD CONSTRAINT uq_shows_venue_id_artist_id_start_time '
+        'UNIQUE USING INDEX uq_shows_venue_id_artist_id_start_time')
+
+
+def downgrade():
+    op.drop_constraint('uq_shows_venue_id_artist_id_start_time', 'shows',
+                       type_='unique')
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_venues_state_city', table_name='venues',
+                      postgresql_concurrently=True)
+        op.drop_index('ix_shows_start_time_id', table_name='shows',
+                      postgresql_concurrently=True)
+        op.drop_index('ix_shows_artist_id_start_time', table_name='shows',
+                      postgresql_concurrently=True)
+        op.drop_index('ix_shows_venue_id_start_time', table_name='shows',
+                      postgresql_concurrently=True)
@@ -0,0 +1,31 @@
+"""add deletions: the time rows were last deleted from each table
+
+Listing pages revalidate against max(updated_at) and this tombstone
+instead of counting every row.
+
+Revision ID: e1b7c3f95a20
+Revises: c4e7a2b9d061
+Create Date: 2026-10-18 23:41:12.538106
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1b7c3f95a20'
+down_revision = 'c4e7a2b9d061'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('deletions',
+    sa.Column('table_name', sa.String(length=63), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('table_name')
+    )
+
+
+def downgrade():
+    op.drop_table('deletions')
@@ -3,19 +3,68 @@
 #----------------------------------------------------------------------------#
 from collections import UserList
 from datetime import datetime
-from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import ARRAY, INT4RANGE, TSTZRANGE
+from routing import RoutingSQLAlchemy
 
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
 
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
+def search_indexes(table):
+    """Trigram and full-text indexes backing queries.search()."""
+    return tuple(
+        db.Index('ix_{}_{}_trgm'.format(table, column), column,
+                 postgresql_using='gin',
+                 postgresql_ops={column: 'gin_trgm_ops'})
+        for column in ('name', 'city', 'state')
+    ) + (
+        db.Index('ix_{}_name_tsv'.format(table),
+                 db.text("to_tsvector('simple', coalesce(name, ''))"),
+                 postgresql_using='gin'),
+    )
+
+# Length of a show when none is given
+DEFAULT_SHOW_MINUTES = 120
+
+
+def booked_span(start='start_time', end='end_time'):
+    """The [start, end) range a show occupies, as indexed by the exclusion constraints."""
+    if isinstance(start, str):
+        start, end = db.literal_column(start), db.literal_column(end)
+    return db.func.tstzrange(start, end)
+
+
+# No two shows may overlap at a venue or for an artist (btree_gist). shows
+# is partitioned on start_time, which these do not compare with '=', so
+# PostgreSQL only allows them on each partition: `suffix` names the
+# partition (None on an unpartitioned table). Shows in different months are
+# kept apart by queries.lock_bookings().
+OVERLAP_CONSTRAINT = (
+    'ALTER TABLE {table} ADD CONSTRAINT {name} '
+    'EXCLUDE USING gist ({side}_id WITH =, tstzrange(start_time, end_time) WITH &&)'
+)
+
+
+def overlap_constraints(table, suffix=None):
+    return [OVERLAP_CONSTRAINT.format(
+                table=table, side=side,
+                name='ex_shows_{}_overlap'.format(side) + ('_' + suffix if suffix else ''))
+            for side in ('venue', 'artist')]
+
 # Venue model
 # -------------------------------------
 
 class Venue(db.Model):
     __tablename__ = 'venues'
+    __table_args__ = search_indexes('venues') + (
+        db.Index('ix_venues_state_city', 'state', 'city'),
+        db.Index('ix_venues_state_lower_city', 'state', db.text('lower(city)')),
+        db.Index('ix_venues_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_venues_created_at_id', db.text('created_at DESC'), db.text('id DESC')),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -27,24 +76,38 @@ class Venue(db.Model):
     facebook_link = db.Column(db.String(120))
 
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
-    genres = db.Column(db.ARRAY(db.String()))
+    genres = db.Column(ARRAY(db.String()))
     website_link = db.Column(db.String())
     seeking_talent = db.Column(db.Boolean, default=True, nullable=False)
     seeking_description = db.Column(db.String())
     shows = db.relationship('Show', back_populates='venue', uselist=False)
 
+    # Denormalized show counters, maintained by the counters module
+    upcoming_shows_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    past_shows_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+
+    created_at = db.Column(db.DateTime(timezone=True), default=db.func.now(),
+                           server_default=db.func.now(), nullable=False)
+    updated_at = db.Column(db.DateTime(timezone=True), default=db.func.now(), onupdate=db.func.now(),
+                           server_default=db.func.now(), nullable=False, index=True)
+
 # Artist model
 # -------------------------------------
 
 class Artist(db.Model):
     __tablename__ = 'artists'
+    __table_args__ = search_indexes('artists') + (
+        db.Index('ix_artists_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_artists_state_lower_city', 'state', db.text('lower(city)')),
+        db.Index('ix_artists_created_at_id', db.text('created_at DESC'), db.text('id DESC')),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String()))
+    genres = db.Column(ARRAY(db.String()))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
 
@@ -52,20 +115,115 @@ class Artist(db.Model):
     seeking_venue = db.Column(db.Boolean, default=True, nullable=False)
     seeking_description = db.Column(db.String(500))
     shows = db.relationship('Show', back_populates='artist')
+    availability = db.relationship('Availability', back_populates='artist',
+                                   cascade='all, delete-orphan',
+                                   order_by='Availability.id')
+
+    # Denormalized show counters, maintained by the counters module
+    upcoming_shows_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    past_shows_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+
+    created_at = db.Column(db.DateTime(timezone=True), default=db.func.now(),
+                           server_default=db.func.now(), nullable=False)
+    updated_at = db.Column(db.DateTime(timezone=True), default=db.func.now(), onupdate=db.func.now(),
+                           server_default=db.func.now(), nullable=False, index=True)
+
+# Availability model
+# -------------------------------------
+
+# Minutes in a week; weekly windows are stored as [start, end) minutes from
+# Monday 00:00 UTC, and may run up to a week past 10080 to wrap into the
+# next week.
+WEEK_MINUTES = 7 * 24 * 60
+
+
+class Availability(db.Model):
+    """A window in which an artist can be booked: one-off or weekly."""
+    __tablename__ = 'availabilities'
+    __table_args__ = (
+        db.CheckConstraint('(period IS NULL) <> (weekly IS NULL)',
+                           name='ck_availabilities_one_kind'),
+        db.CheckConstraint(
+            'weekly IS NULL OR (lower(weekly) >= 0 AND lower(weekly) < {0} '
+            'AND upper(weekly) - lower(weekly) <= {0})'.format(WEEK_MINUTES),
+            name='ck_availabilities_weekly_bounds'),
+        db.Index('ix_availabilities_period', 'period', postgresql_using='gist'),
+        db.Index('ix_availabilities_weekly', 'weekly', postgresql_using='gist'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    artist_id = db.Column(db.Integer, db.ForeignKey('artists.id', ondelete='CASCADE'),
+                          nullable=False, index=True)
+    period = db.Column(TSTZRANGE)
+    weekly = db.Column(INT4RANGE)
+
+    created_at = db.Column(db.DateTime(timezone=True), default=db.func.now(),
+                           server_default=db.func.now(), nullable=False)
+
+    artist = db.relationship('Artist', back_populates='availability')
 
 # Shows model
 # -------------------------------------
 
 class Show(db.Model):
     __tablename__ = 'shows'
+    __table_args__ = (
+        db.Index('ix_shows_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_shows_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_shows_start_time_id', 'start_time', 'id'),
+        db.Index('ix_shows_pending_rollover', 'start_time',
+                 postgresql_where=db.text('NOT counted_past')),
+        # Monthly partitions are managed by partitions.py.
+        {'postgresql_partition_by': 'RANGE (start_time)'},
+    )
 
+    # The partition key has to be part of the table's primary key; rows
+    # are still identified by id alone.
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     artist_id = db.Column(db.Integer, db.ForeignKey(
         'artists.id'), nullable=False)
     venue_id = db.Column(db.Integer, db.ForeignKey(
         'venues.id'), nullable=False)
-    start_time = db.Column(db.DateTime(timezone=True), nullable=False)
+    start_time = db.Column(db.DateTime(timezone=True), primary_key=True)
+    end_time = db.Column(db.DateTime(timezone=True), nullable=False)
+
+    # Which counter (past or upcoming) this show is currently counted in
+    counted_past = db.Column(db.Boolean, default=False, server_default=db.false(), nullable=False)
+
+    created_at = db.Column(db.DateTime(timezone=True), default=db.func.now(),
+                           server_default=db.func.now(), nullable=False)
+    updated_at = db.Column(db.DateTime(timezone=True), default=db.func.now(), onupdate=db.func.now(),
+                           server_default=db.func.now(), nullable=False, index=True)
 
     # Many-to-many relationship using the latest recommended method at this time
     artist = db.relationship('Artist', back_populates='shows')
     venue = db.relationship('Venue', back_populates='shows', uselist=False)
+
+    __mapper_args__ = {'primary_key': [id]}
+
+    @property
+    def duration(self):
+        return self.end_time - self.start_time
+
+
+@event.listens_for(Show.__table__, 'after_create')
+def create_default_partition(target, connection, **kw):
+    # Rows outside every monthly partition land here until one is created.
+    connection.execute(db.text('CREATE TABLE shows_default PARTITION OF shows DEFAULT'))
+    for statement in overlap_constraints('shows_default', 'default'):
+        connection.execute(db.text(statement))
+
+# Deletion model
+# -------------------------------------
+
+class Deletion(db.Model):
+    """When rows were last deleted from a table.
+
+    Deletes leave no updated_at behind, so listing pages revalidate
+    against this as well as against max(updated_at).
+    """
+    __tablename__ = 'deletions'
+
+    table_name = db.Column(db.String(63), primary_key=True)
+    deleted_at = db.Column(db.DateTime(timezone=True), default=db.func.now(),
+                           server_default=db.func.now(), nullable=False)
@@ -0,0 +1,148 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import re
+from datetime import date, datetime, timezone
+
+import counters
+from models import db, overlap_constraints
+
+#----------------------------------------------------------------------------#
+# Monthly partitions of shows.
+#----------------------------------------------------------------------------#
+
+# shows is range-partitioned on start_time into one table per UTC month
+# (shows_y2026m10, ...), plus shows_default for rows no month covers yet.
+# `flask shows partitions`, run daily, creates the months up to
+# SHOWS_PARTITIONS_AHEAD ahead and archives the months older than
+# SHOWS_ARCHIVE_AFTER_MONTHS: they are detached into the archive schema,
+# where no page or counter sees them any more.
+#
+# The migration that partitioned shows attached the existing table as is,
+# renamed shows_before_<month>: one partition for every show before then.
+#
+# Each partition carries its own overlap constraints, so the database only
+# compares a show with others starting in the same month. A show running
+# past midnight on the last day of a month is checked against the next
+# month by booking_conflicts() before it is inserted, under the advisory
+# locks of queries.lock_bookings() so no other booking can race the check.
+
+PARTITION = re.compile(r'^shows_(before_)?y(\d{4})m(\d{2})$')
+CONSTRAINT_SUFFIX = re.compile(r'_((before_)?y\d{4}m\d{2}|default)$')
+ARCHIVE_SCHEMA = 'archive'
+
+
+def month_start(moment):
+    return date(moment.year, moment.month, 1)
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return 'shows_y{0:%Y}m{0:%m}'.format(month)
+
+
+def overlap_constraint(name):
+    """The overlap constraint a partition's constraint name stands for."""
+    return CONSTRAINT_SUFFIX.sub('', name) if name else name
+
+
+def _bound(month):
+    return datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+
+
+def existing_partitions():
+    """{month: table name} for the monthly partitions attached to shows.
+
+    shows_before_<month> is keyed by the last month it holds.
+    """
+    names = db.session.execute(db.text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = 'shows'::regclass"
+    )).scalars()
+    partitions = {}
+    for name in names:
+        match = PARTITION.match(name)
+        if match:
+            month = date(int(match.group(2)), int(match.group(3)), 1)
+            partitions[add_months(month, -1) if match.group(1) else month] = name
+    return partitions
+
+
+def create_partition(month):
+    """Create and attach the partition for `month`.
+
+    Rows of that month already in shows_default are moved into it first;
+    PostgreSQL refuses to attach a range the default partition holds rows for.
+    """
+    name = partition_name(month)
+    bounds = {"lower": _bound(month), "upper": _bound(add_months(month, 1))}
+    db.session.execute(db.text(
+        'CREATE TABLE {} (LIKE shows INCLUDING DEFAULTS)'.format(name)))
+    db.session.execute(db.text(
+        'WITH moved AS (DELETE FROM shows_default '
+        'WHERE start_time >= :lower AND start_time < :upper RETURNING *) '
+        'INSERT INTO {} SELECT * FROM moved'.format(name)), bounds)
+    for statement in overlap_constraints(name, name[len('shows_'):]):
+        db.session.execute(db.text(statement))
+    db.session.execute(db.text(
+        'ALTER TABLE shows ATTACH PARTITION {} '
+        'FOR VALUES FROM (:lower) TO (:upper)'.format(name)), bounds)
+    return name
+
+
+def ensure_partitions(ahead, today=None):
+    """Create any missing partition from this month to `ahead` months on."""
+    this_month = month_start(today or datetime.now(timezone.utc))
+    existing = existing_partitions()
+    # Every month up to the last one in shows_before_<month> is covered.
+    first = max([add_months(month, 1) for month, name in existing.items()
+                 if name.startswith('shows_before_')], default=this_month)
+    return [
+        create_partition(month)
+        for month in (add_months(this_month, offset) for offset in range(ahead + 1))
+        if month >= first and month not in existing
+    ]
+
+
+def archive_partition(name):
+    """Detach a partition into the archive schema and uncount its shows."""
+    for model, key in counters.COUNTED:
+        db.session.execute(db.text('''
+            UPDATE {table}
+            SET upcoming_shows_count = upcoming_shows_count - m.upcoming,
+                past_shows_count = past_shows_count - m.past,
+                updated_at = now()
+            FROM (
+                SELECT {key} AS id,
+                       count(*) FILTER (WHERE NOT counted_past) AS upcoming,
+                       count(*) FILTER (WHERE counted_past) AS past
+                FROM {partition} GROUP BY {key}
+            ) AS m
+            WHERE {table}.id = m.id
+        '''.format(table=model.__tablename__, key=key.name, partition=name)))
+
+    db.session.execute(db.text('ALTER TABLE shows DETACH PARTITION {}'.format(name)))
+    # Archived shows must not keep their venue or artist from being deleted.
+    foreign_keys = db.session.execute(db.text(
+        "SELECT conname FROM pg_constraint "
+        "WHERE conrelid = CAST(:name AS regclass) AND contype = 'f'"), {"name": name}).scalars().all()
+    for constraint in foreign_keys:
+        db.session.execute(db.text('ALTER TABLE {} DROP CONSTRAINT {}'.format(name, constraint)))
+    db.session.execute(db.text('CREATE SCHEMA IF NOT EXISTS {}'.format(ARCHIVE_SCHEMA)))
+    db.session.execute(db.text('ALTER TABLE {} SET SCHEMA {}'.format(name, ARCHIVE_SCHEMA)))
+    return name
+
+
+def archive_partitions(after_months, today=None):
+    """Archive every partition that ended more than `after_months` ago."""
+    cutoff = add_months(month_start(today or datetime.now(timezone.utc)), -after_months)
+    return [
+        archive_partition(name)
+        for month, name in sorted(existing_partitions().items())
+        if add_months(month, 1) <= cutoff
+    ]
@@ -0,0 +1,799 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import calendar
+import re
+from datetime import date, datetime, timedelta, timezone
+from itertools import groupby
+from operator import attrgetter
+
+from psycopg2.extras import DateTimeTZRange, NumericRange
+from sqlalchemy.dialects.postgresql import insert
+
+from models import Venue, Artist, Show, Availability, Deletion, db, booked_span, WEEK_MINUTES
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+# Venues
+# -------------------------------------
+
+def venue_areas(genres=None, match='all'):
+    """Return the /venues tree (area -> venues -> upcoming count).
+
+    The tree is built from a single query over venues alone, ordered by
+    area, so the number of round-trips does not depend on how many venues
+    or areas exist; upcoming counts come from the maintained counters.
+    `genres` narrows it to venues with all (or, with match='any', some)
+    of those genres.
+    """
+    rows = (
+        db.session.query(
+            Venue.id,
+            Venue.name,
+            Venue.city,
+            Venue.state,
+            Venue.upcoming_shows_count.label('num_upcoming_shows'),
+        )
+        .filter(*genre_filter(Venue, genres, match))
+        .order_by(Venue.state, Venue.city, Venue.name)
+        .all()
+    )
+
+    return [
+        {
+            "city": city,
+            "state": state,
+            "venues": [
+                {
+                    "id": row.id,
+                    "name": row.name,
+                    "num_upcoming_shows": row.num_upcoming_shows,
+                }
+                for row in area
+            ],
+        }
+        for (state, city), area in groupby(rows, key=attrgetter('state', 'city'))
+    ]
+
+
+def venue_detail(venue_id, past_page=1, upcoming_page=1, per_page=10):
+    """Return the show_venue payload, or None if the venue does not exist."""
+    venue = Venue.query.get(venue_id)
+    if venue is None:
+        return None
+
+    data = {
+        "id": venue.id,
+        "name": venue.name,
+        "genres": venue.genres,
+        "address": venue.address,
+        "city": venue.city,
+        "state": venue.state,
+        "phone": venue.phone,
+        "website_link": venue.website_link,
+        "facebook_link": venue.facebook_link,
+        "seeking_talent": venue.seeking_talent,
+        "seeking_description": venue.seeking_description,
+        "image_link": venue.image_link,
+    }
+    data.update(_entity_shows(
+        Show.venue_id, venue_id, Show.artist_id, Artist, 'artist',
+        venue.upcoming_shows_count + venue.past_shows_count,
+        past_page, upcoming_page, per_page))
+    return data
+
+# Artists
+# -------------------------------------
+
+def artist_detail(artist_id, past_page=1, upcoming_page=1, per_page=10):
+    """Return the show_artist payload, or None if the artist does not exist."""
+    artist = Artist.query.get(artist_id)
+    if artist is None:
+        return None
+
+    data = {
+        "id": artist.id,
+        "name": artist.name,
+        "genres": artist.genres,
+        "city": artist.city,
+        "state": artist.state,
+        "phone": artist.phone,
+        "website_link": artist.website_link,
+        "facebook_link": artist.facebook_link,
+        "seeking_venue": artist.seeking_venue,
+        "seeking_description": artist.seeking_description,
+        "image_link": artist.image_link,
+    }
+    data.update(_entity_shows(
+        Show.artist_id, artist_id, Show.venue_id, Venue, 'venue',
+        artist.upcoming_shows_count + artist.past_shows_count,
+        past_page, upcoming_page, per_page))
+    return data
+
+def artist_listing(genres=None, match='all'):
+    return [
+        {"id": row.id, "name": row.name}
+        for row in db.session.query(Artist.id, Artist.name)
+        .filter(*genre_filter(Artist, genres, match))
+    ]
+
+# Recently listed
+# -------------------------------------
+
+RECENT_LIMIT = 10
+
+
+def recent_item(row):
+    return {"id": row.id, "name": row.name, "image_link": row.image_link}
+
+
+def recent(model, limit=RECENT_LIMIT):
+    """The `limit` newest venues or artists, newest first.
+
+    Reads the top of the (created_at DESC, id DESC) index and stops, so
+    the cost does not grow with the table.
+    """
+    rows = (
+        db.session.query(model.id, model.name, model.image_link)
+        .order_by(model.created_at.desc(), model.id.desc())
+        .limit(limit)
+    )
+    return [recent_item(row) for row in rows]
+
+
+def push_recent(items, item, limit=RECENT_LIMIT):
+    """A new recent list with `item` (just created) in front."""
+    return [item] + [other for other in items if other["id"] != item["id"]][:limit - 1]
+
+# Genres
+# -------------------------------------
+
+def genre_filter(model, genres, match='all'):
+    """Criteria for rows having all (@>) or any (&&) of `genres`.
+
+    Both operators are served by the GIN index on the genres column.
+    """
+    if not genres:
+        return ()
+    if match == 'any':
+        return (model.genres.overlap(genres),)
+    return (model.genres.contains(genres),)
+
+
+def genre_counts(model, options):
+    """Number of venues or artists per genre, in `options` order.
+
+    One aggregate over the unnested genre arrays; genres nobody has
+    come back with a count of 0.
+    """
+    tags = db.session.query(
+        model.id, db.func.unnest(model.genres).label('genre')).subquery()
+    counts = dict(
+        db.session.query(tags.c.genre, db.func.count(db.distinct(tags.c.id)))
+        .filter(tags.c.genre.in_(options))
+        .group_by(tags.c.genre)
+    )
+    return [{"genre": option, "count": counts.get(option, 0)} for option in options]
+
+# Search
+# -------------------------------------
+
+def search(model, term, limit=50):
+    """Ranked name/city/state search over venues or artists.
+
+    Substring matches are served by the pg_trgm indexes and word-prefix
+    matches by the to_tsvector index, so the cost tracks the number of
+    hits rather than the table size. Hits come back with their
+    upcoming-show counts and the total hit count from a single query.
+    """
+    term = term.strip()
+    pattern = '%' + re.sub(r'([\\%_])', r'\\\1', term) + '%'
+    document = db.func.to_tsvector('simple', db.func.coalesce(model.name, ''))
+
+    conditions = [
+        model.name.ilike(pattern, escape='\\'),
+        model.city.ilike(pattern, escape='\\'),
+        model.state.ilike(pattern, escape='\\'),
+    ]
+    rank = db.func.similarity(model.name, term)
+
+    words = re.findall(r'\w+', term)
+    if words:
+        prefix_query = db.func.to_tsquery(
+            'simple', ' & '.join(word + ':*' for word in words))
+        conditions.append(document.op('@@')(prefix_query))
+        rank = rank + db.func.ts_rank(document, prefix_query)
+
+    rows = (
+        db.session.query(
+            model.id,
+            model.name,
+            model.upcoming_shows_count.label('num_upcoming_shows'),
+            db.func.count().over().label('total'),
+        )
+        .filter(db.or_(*conditions))
+        .order_by(rank.desc(), model.name)
+        .limit(limit)
+        .all()
+    )
+
+    return {
+        "count": rows[0].total if rows else 0,
+        "data": [
+            {
+                "id": row.id,
+                "name": row.name,
+                "num_upcoming_shows": row.num_upcoming_shows,
+            }
+            for row in rows
+        ],
+    }
+
+
+LOCATION = re.compile(r'^\s*(?P<city>[^,]*\S)\s*,\s*(?P<state>[A-Za-z]{2})\s*$')
+
+
+def parse_location(term, states):
+    """Split "City, ST" into (lowercased city, state), or None.
+
+    Runs of whitespace in the city collapse to one space and the state
+    must be one of `states`, so free text falls through to name search.
+    """
+    match = LOCATION.match(term)
+    if match is None:
+        return None
+    state = match.group('state').upper()
+    if state not in states:
+        return None
+    return ' '.join(match.group('city').split()).lower(), state
+
+
+def _located(model, kind, city, state, limit):
+    return (
+        db.select(
+            db.literal(kind).label('kind'),
+            model.id,
+            model.name,
+            model.upcoming_shows_count.label('num_upcoming_shows'),
+            db.func.count().over().label('total'),
+        )
+        .where(model.state == state, db.func.lower(model.city) == city)
+        .order_by(model.name)
+        .limit(limit)
+    )
+
+
+def location_search(city, state, limit=50):
+    """Venues and artists in one city, from a single UNION ALL query.
+
+    Both halves are served by the (state, lower(city)) indexes; each
+    comes back in the search() shape with its upcoming-show counts.
+    """
+    located = db.union_all(
+        _located(Venue, 'venues', city, state, limit),
+        _located(Artist, 'artists', city, state, limit),
+    )
+    results = {kind: {"count": 0, "data": []} for kind in ('venues', 'artists')}
+    for row in db.session.execute(located):
+        results[row.kind]["count"] = row.total
+        results[row.kind]["data"].append({
+            "id": row.id,
+            "name": row.name,
+            "num_upcoming_shows": row.num_upcoming_shows,
+        })
+    return results
+
+# Shows
+# -------------------------------------
+
+def _show_listing():
+    """Shows joined with their venue and artist, in keyset order."""
+    return (
+        db.session.query(
+            Show.id,
+            Show.start_time,
+            Venue.id.label('venue_id'),
+            Venue.name.label('venue_name'),
+            Artist.id.label('artist_id'),
+            Artist.name.label('artist_name'),
+            Artist.image_link.label('artist_image_link'),
+        )
+        .join(Venue, Show.venue_id == Venue.id)
+        .join(Artist, Show.artist_id == Artist.id)
+        .order_by(Show.start_time, Show.id)
+    )
+
+
+def _show_tile(row):
+    return {
+        "venue_id": row.venue_id,
+        "venue_name": row.venue_name,
+        "artist_id": row.artist_id,
+        "artist_name": row.artist_name,
+        "artist_image_link": row.artist_image_link,
+        "start_time": row.start_time,
+    }
+
+
+def encode_cursor(start_time, show_id):
+    return '{}~{}'.format(start_time.isoformat(), show_id)
+
+
+def decode_cursor(cursor):
+    """Parse a /shows cursor; raises ValueError when it is malformed."""
+    start_time, _, show_id = cursor.rpartition('~')
+    return datetime.fromisoformat(start_time), int(show_id)
+
+
+def show_page(after=None, per_page=30):
+    """Return one page of /shows starting strictly after the `after` key.
+
+    Pages are addressed by a (start_time, id) keyset rather than OFFSET,
+    so every page costs the same however deep into the table it is.
+    """
+    query = _show_listing()
+    if after is not None:
+        query = query.filter(db.tuple_(Show.start_time, Show.id) > after)
+    rows = query.limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(rows[-1].start_time, rows[-1].id)
+
+    return {
+        "shows": [_show_tile(row) for row in rows],
+        "next_cursor": next_cursor,
+    }
+
+
+def iter_shows(batch_size=500):
+    """Yield every /shows tile from a server-side cursor, in constant memory."""
+    query = (
+        _show_listing()
+        .execution_options(stream_results=True)
+        .yield_per(batch_size)
+    )
+    for row in query:
+        yield _show_tile(row)
+
+
+def booking_conflicts(venue_id, artist_id, start_time, end_time):
+    """Shows overlapping [start_time, end_time) at the venue or for the artist.
+
+    Each side of the OR is one probe of the GiST index behind its
+    exclusion constraint, whatever the number of shows.
+    """
+    return (
+        db.session.query(Show.id, Show.venue_id, Show.artist_id, Show.start_time, Show.end_time)
+        .filter(
+            db.or_(Show.venue_id == venue_id, Show.artist_id == artist_id),
+            booked_span(Show.start_time, Show.end_time).op('&&')(
+                booked_span(start_time, end_time)),
+        )
+        .all()
+    )
+
+
+def tour_conflicts(artist_id, dates):
+    """Existing shows clashing with any date of a tour, in one query.
+
+    `dates` are (line, venue_id, start_time, end_time) tuples; each
+    returned row carries the line it clashes with.
+    """
+    return batch_conflicts([
+        (line, venue_id, artist_id, start_time, end_time)
+        for line, venue_id, start_time, end_time in dates
+    ])
+
+
+def batch_conflicts(bookings):
+    """Existing shows clashing with any of many bookings, in one query.
+
+    `bookings` are (line, venue_id, artist_id, start_time, end_time)
+    tuples, sent as a VALUES list; each returned row carries the line it
+    clashes with.
+    """
+    batch = db.values(
+        db.column('line', db.Integer),
+        db.column('venue_id', db.Integer),
+        db.column('artist_id', db.Integer),
+        db.column('start_time', db.DateTime(timezone=True)),
+        db.column('end_time', db.DateTime(timezone=True)),
+        name='batch',
+    ).data(bookings)
+    return (
+        db.session.query(batch.c.line, Show.id, Show.venue_id, Show.artist_id,
+                         Show.start_time, Show.end_time)
+        .select_from(batch)
+        .join(Show, db.and_(
+            db.or_(Show.venue_id == batch.c.venue_id, Show.artist_id == batch.c.artist_id),
+            booked_span(Show.start_time, Show.end_time).op('&&')(
+                booked_span(batch.c.start_time, batch.c.end_time)),
+        ))
+        .order_by(batch.c.line, Show.start_time)
+        .all()
+    )
+
+
+# The overlap constraints live on each monthly partition of shows, so the
+# database never compares two shows starting in different months: a show
+# running past midnight at the end of a month can clash with one booked in
+# the next. Every booking therefore checks for conflicts and inserts while
+# holding transaction-level advisory locks, keyed (1, venue_id) and
+# (2, artist_id); bulk imports take the exclusive (0, 0) lock that every
+# booking shares, instead of one lock per row.
+
+BOOKING_LOCK_SPACES = {'venue': 1, 'artist': 2}
+
+
+def lock_bookings(venue_ids=(), artist_ids=()):
+    """Serialize bookings of these venues and artists until commit.
+
+    The locks are taken in one statement, in sorted order, so two tours
+    sharing venues cannot deadlock.
+    """
+    keys = sorted(
+        {(BOOKING_LOCK_SPACES['venue'], int(id)) for id in venue_ids}
+        | {(BOOKING_LOCK_SPACES['artist'], int(id)) for id in artist_ids})
+    db.session.execute(db.text('SELECT pg_advisory_xact_lock_shared(0, 0)'))
+    db.session.execute(db.text(
+        'SELECT count(pg_advisory_xact_lock(k.space, k.id)) '
+        'FROM unnest(CAST(:spaces AS integer[]), CAST(:ids AS integer[])) AS k(space, id)'),
+        {"spaces": [space for space, _ in keys], "ids": [id for _, id in keys]})
+
+
+def lock_all_bookings():
+    """Hold off every other booking until commit, for bulk inserts."""
+    db.session.execute(db.text('SELECT pg_advisory_xact_lock(0, 0)'))
+
+
+# Calendar
+# -------------------------------------
+
+# Calendar days are UTC days, like the weekly availability windows.
+
+MAX_CALENDAR_DAYS = 366
+
+# Sent as seconds, so day boundaries stay 24h apart whatever the session
+# time zone does around DST changes.
+DAY = timedelta(hours=24)
+
+
+def calendar_range(start=None, end=None):
+    """First and last day from ISO date strings; defaults to this month.
+
+    Raises ValueError for malformed dates or a range that is empty or
+    longer than MAX_CALENDAR_DAYS.
+    """
+    today = datetime.now(timezone.utc).date()
+    first = date.fromisoformat(start) if start else today.replace(day=1)
+    if end:
+        last = date.fromisoformat(end)
+    elif start:
+        last = first + timedelta(days=30)
+    else:
+        last = first.replace(day=calendar.monthrange(first.year, first.month)[1])
+    if not 0 <= (last - first).days < MAX_CALENDAR_DAYS:
+        raise ValueError('invalid calendar range')
+    return first, last
+
+
+def calendar_month(first, last):
+    """'YYYY-MM' when [first, last] is exactly one month, else None."""
+    if first.day == 1 and last == first.replace(
+            day=calendar.monthrange(first.year, first.month)[1]):
+        return '{:%Y-%m}'.format(first)
+    return None
+
+
+def show_months(start_time, end_time):
+    """The 'YYYY-MM' calendar months a show touches."""
+    first = start_time.astimezone(timezone.utc).date().replace(day=1)
+    last = (end_time - timedelta(microseconds=1)).astimezone(timezone.utc).date()
+    months = []
+    while first <= last:
+        months.append('{:%Y-%m}'.format(first))
+        first = (first + timedelta(days=32)).replace(day=1)
+    return months
+
+
+def venue_calendar(venue_id, first, last):
+    """Every day from `first` to `last` with the venue's shows on it.
+
+    One query: generate_series produces the days and each is outer-joined
+    to the shows overlapping it, found through the GiST index behind
+    ex_shows_venue_overlap, so free days come back as a row too.
+    """
+    start = datetime.combine(first, datetime.min.time(), timezone.utc)
+    days = (
+        db.func.generate_series(start, start + timedelta(days=(last - first).days),
+                                DAY)
+        .table_valued('day')
+        .render_derived(name='days')
+    )
+    rows = (
+        db.session.query(
+            days.c.day,
+            Show.id,
+            Show.artist_id,
+            Artist.name.label('artist_name'),
+            Show.start_time,
+            Show.end_time,
+        )
+        .select_from(days)
+        .outerjoin(Show, db.and_(
+            Show.venue_id == venue_id,
+            booked_span(Show.start_time, Show.end_time).op('&&')(
+                db.func.tstzrange(days.c.day, days.c.day + DAY)),
+        ))
+        .outerjoin(Artist, Artist.id == Show.artist_id)
+        .order_by(days.c.day, Show.start_time)
+    )
+
+    result = []
+    for day, group in groupby(rows, key=attrgetter('day')):
+        shows = [
+            {
+                "id": row.id,
+                "artist_id": row.artist_id,
+                "artist_name": row.artist_name,
+                "start_time": row.start_time,
+                "end_time": row.end_time,
+            }
+            for row in group if row.id is not None
+        ]
+        result.append({"date": day.astimezone(timezone.utc).date(),
+                       "booked": bool(shows), "shows": shows})
+    return result
+
+
+# Availability
+# -------------------------------------
+
+def week_minute(moment):
+    """Minutes since Monday 00:00 UTC of an aware datetime."""
+    moment = moment.astimezone(timezone.utc)
+    return moment.weekday() * 24 * 60 + moment.hour * 60 + moment.minute
+
+
+def once_window(start_time, end_time):
+    return DateTimeTZRange(start_time, end_time, '[)')
+
+
+def weekly_window(weekday, from_time, to_time):
+    """Weekly window on `weekday` (0 = Monday) between two UTC times.
+
+    A to_time at or before from_time runs past midnight into the next day.
+    """
+    start = weekday * 24 * 60 + from_time.hour * 60 + from_time.minute
+    end = weekday * 24 * 60 + to_time.hour * 60 + to_time.minute
+    if end <= start:
+        end += 24 * 60
+    return NumericRange(start, end, '[)')
+
+
+def describe_window(availability):
+    if availability.period is not None:
+        return {"id": availability.id, "kind": "once",
+                "starts_at": availability.period.lower, "ends_at": availability.period.upper}
+    start, end = availability.weekly.lower, availability.weekly.upper
+    return {"id": availability.id, "kind": "weekly",
+            "weekday": calendar.day_name[start // (24 * 60) % 7],
+            "from": '{:02d}:{:02d}'.format(start // 60 % 24, start % 60),
+            "to": '{:02d}:{:02d}'.format(end // 60 % 24, end % 60)}
+
+
+def _covering(start_time, end_time):
+    """Criterion for availability windows that contain the whole slot.
+
+    Served by the GiST indexes on period and weekly. A weekly slot is
+    tried both as is and shifted a week on, to match windows that wrap
+    past Sunday midnight.
+    """
+    start = week_minute(start_time)
+    end = start + int((end_time - start_time).total_seconds() // 60)
+    return db.or_(
+        Availability.period.op('@>')(booked_span(start_time, end_time)),
+        Availability.weekly.op('@>')(db.func.int4range(start, end)),
+        Availability.weekly.op('@>')(
+            db.func.int4range(start + WEEK_MINUTES, end + WEEK_MINUTES)),
+    )
+
+
+def artist_available(artist_id, start_time, end_time):
+    """Whether the artist can play [start_time, end_time).
+
+    Artists who have published no windows are not restricted.
+    """
+    windows = db.session.query(Availability.id).filter(Availability.artist_id == artist_id)
+    return db.session.query(
+        db.or_(~windows.exists(), windows.filter(_covering(start_time, end_time)).exists())
+    ).scalar()
+
+
+def unavailable_dates(artist_id, dates):
+    """Lines of (line, start_time, end_time) `dates` outside the artist's windows.
+
+    The artist's windows are read once and matched in Python, so a whole
+    tour costs one query.
+    """
+    windows = (
+        db.session.query(Availability.period, Availability.weekly)
+        .filter(Availability.artist_id == artist_id)
+        .all()
+    )
+    if not windows:
+        return set()
+
+    unavailable = set()
+    for line, start_time, end_time in dates:
+        start = week_minute(start_time)
+        end = start + int((end_time - start_time).total_seconds() // 60)
+        if not any(
+            period.lower <= start_time and end_time <= period.upper
+            if period is not None else
+            any(weekly.lower <= start + shift and end + shift <= weekly.upper
+                for shift in (0, WEEK_MINUTES))
+            for period, weekly in windows
+        ):
+            unavailable.add(line)
+    return unavailable
+
+
+def bookable_artists(start_time, end_time):
+    """Artists free for the slot and with no show overlapping it.
+
+    Like artist_available(), artists who have published no windows are
+    free whenever they are not booked. One query: the windows come from
+    the GiST range indexes and the clashing shows from the
+    ex_shows_artist_overlap indexes.
+    """
+    windows = db.session.query(Availability.id).filter(Availability.artist_id == Artist.id)
+    available = (
+        db.session.query(Availability.artist_id)
+        .filter(_covering(start_time, end_time))
+    )
+    booked = (
+        db.session.query(Show.id)
+        .filter(
+            Show.artist_id == Artist.id,
+            booked_span(Show.start_time, Show.end_time).op('&&')(
+                booked_span(start_time, end_time)),
+        )
+    )
+    rows = (
+        db.session.query(Artist.id, Artist.name, Artist.image_link)
+        .filter(db.or_(Artist.id.in_(available), ~windows.exists()), ~booked.exists())
+        .order_by(Artist.name)
+    )
+    return [
+        {"id": row.id, "name": row.name, "image_link": row.image_link}
+        for row in rows
+    ]
+
+
+def venue_free(venue_id, start_time, end_time):
+    return not db.session.query(
+        db.session.query(Show.id)
+        .filter(
+            Show.venue_id == venue_id,
+            booked_span(Show.start_time, Show.end_time).op('&&')(
+                booked_span(start_time, end_time)),
+        )
+        .exists()
+    ).scalar()
+
+
+def related_ids(key, other_key, entity_id):
+    """Ids on the other side of every show booked by one venue/artist."""
+    return [
+        row[0]
+        for row in db.session.query(other_key).filter(key == entity_id).distinct()
+    ]
+
+
+def record_deletion(model):
+    """Note that rows of `model` were deleted, for listing_stamp()."""
+    db.session.execute(
+        insert(Deletion)
+        .values(table_name=model.__tablename__, deleted_at=db.func.now())
+        .on_conflict_do_update(index_elements=[Deletion.table_name],
+                               set_={"deleted_at": db.func.now()})
+    )
+
+
+def touch(model, ids):
+    """Bump updated_at on rows whose pages embed data that just changed."""
+    if ids:
+        db.session.execute(
+            db.update(model)
+            .where(model.id.in_(ids))
+            .values(updated_at=db.func.now())
+            .execution_options(synchronize_session=False)
+        )
+
+def _entity_shows(key, entity_id, other_key, other, prefix, total,
+                  past_page, upcoming_page, per_page):
+    """Load past and upcoming shows of one venue/artist in three queries.
+
+    `key` is the Show column pointing at the entity; `other_key`/`other`
+    describe the opposite side of the show, whose name and image are
+    joined in. `total` is the entity's show count from its counters.
+    Each list is split and paged in SQL so a busy future calendar never
+    hides the past shows (and vice versa).
+    """
+    # A literal (rather than now()) lets the planner prune the monthly
+    # partitions: upcoming queries only touch this month's and later ones,
+    # and the past count is what the counters' total leaves over.
+    upcoming = Show.start_time > datetime.now(timezone.utc)
+    upcoming_count = (
+        db.session.query(db.func.count(Show.id))
+        .filter(key == entity_id, upcoming)
+        .scalar()
+    )
+    past_count = max(total - upcoming_count, 0)
+
+    def page(condition, order, page_number):
+        rows = (
+            db.session.query(other.id, other.name, other.image_link, Show.start_time)
+            .join(Show, other_key == other.id)
+            .filter(key == entity_id, condition)
+            .order_by(order, Show.id)
+            .limit(per_page)
+            .offset((max(page_number, 1) - 1) * per_page)
+        )
+        return [
+            {
+                prefix + "_id": row.id,
+                prefix + "_name": row.name,
+                prefix + "_image_link": row.image_link,
+                "start_time": row.start_time,
+            }
+            for row in rows
+        ]
+
+    return {
+        "past_shows": page(db.not_(upcoming), Show.start_time.desc(), past_page),
+        "upcoming_shows": page(upcoming, Show.start_time.asc(), upcoming_page),
+        "past_shows_count": past_count,
+        "upcoming_shows_count": upcoming_count,
+        "past_page": past_page,
+        "upcoming_page": upcoming_page,
+        "per_page": per_page,
+    }
+
+# Revalidation
+# -------------------------------------
+
+# Cheap validators checked before a page is built. Each returns
+# (last_modified, etag), or None when there is nothing to validate.
+
+def entity_stamp(model, entity_id):
+    updated_at = (
+        db.session.query(model.updated_at)
+        .filter(model.id == entity_id)
+        .scalar()
+    )
+    if updated_at is None:
+        return None
+    return updated_at, '{:.6f}'.format(updated_at.timestamp())
+
+
+def listing_stamp(model):
+    # max(updated_at) is read from the end of its index; deletes, which
+    # leave no timestamp behind, are caught by the table's tombstone.
+    updated_at, deleted_at = db.session.query(
+        db.session.query(db.func.max(model.updated_at)).scalar_subquery(),
+        db.session.query(Deletion.deleted_at)
+        .filter(Deletion.table_name == model.__tablename__)
+        .scalar_subquery(),
+    ).one()
+    if updated_at is None:
+        return None
+    if deleted_at is None:
+        return updated_at, '{:.6f}'.format(updated_at.timestamp())
+    return max(updated_at, deleted_at), '{:.6f}-{:.6f}'.format(
+        updated_at.timestamp(), deleted_at.timestamp())
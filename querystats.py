@@ -0,0 +1,121 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# Per-request query counting.
+#----------------------------------------------------------------------------#
+
+# Every statement run through any engine (primary or replica) is counted
+# against the current request, along with the time spent waiting on it.
+# A statement shape repeated QUERY_REPEAT_THRESHOLD times in one request is
+# logged as a likely N+1. QUERY_STATS_HEADERS adds X-Query-Count and
+# Server-Timing to responses; it is off in production.
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+
+    def record(self, statement, seconds):
+        self.count += 1
+        self.seconds += seconds
+        self.shapes[' '.join(statement.split())] += 1
+
+    def repeated(self, threshold):
+        return [(shape, times) for shape, times in self.shapes.most_common()
+                if times >= threshold]
+
+
+_local = threading.local()
+
+
+def _collectors():
+    collectors = list(getattr(_local, 'budgets', ()))
+    if has_request_context() and 'query_stats' in g:
+        collectors.append(g.query_stats)
+    return collectors
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info['query_started'].pop()
+    for stats in _collectors():
+        stats.record(statement, seconds)
+
+
+@event.listens_for(Engine, 'handle_error')
+def _failed_execute(exception_context):
+    # after_cursor_execute is skipped for failed statements.
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('query_started'):
+        connection.info['query_started'].pop()
+
+
+def init_app(app):
+    app.config.setdefault('QUERY_STATS_HEADERS', False)
+    app.config.setdefault('QUERY_REPEAT_THRESHOLD', 5)
+
+    @app.before_request
+    def start_query_stats():
+        g.query_stats = QueryStats()
+
+    @app.after_request
+    def report_query_stats(response):
+        stats = g.get('query_stats')
+        if stats is None:
+            return response
+
+        for shape, times in stats.repeated(app.config['QUERY_REPEAT_THRESHOLD']):
+            app.logger.warning('Possible N+1 on %s %s: %d x %s',
+                               request.method, request.path, times, shape)
+
+        if app.config['QUERY_STATS_HEADERS']:
+            response.headers['X-Query-Count'] = str(stats.count)
+            response.headers.add(
+                'Server-Timing',
+                'db;dur={:.1f};desc="{} queries"'.format(stats.seconds * 1000, stats.count))
+        return response
+
+#----------------------------------------------------------------------------#
+# Query budgets.
+#----------------------------------------------------------------------------#
+
+
+@contextmanager
+def query_budget(max_queries):
+    """Fail if the block runs more than `max_queries` statements.
+
+    Meant for tests, around test-client calls:
+
+        with query_budget(4):
+            client.get('/venues/1')
+    """
+    stats = QueryStats()
+    budgets = _local.__dict__.setdefault('budgets', [])
+    budgets.append(stats)
+    try:
+        yield stats
+    finally:
+        budgets.remove(stats)
+
+    if stats.count > max_queries:
+        raise AssertionError('{} queries run, budget is {}:\n{}'.format(
+            stats.count, max_queries,
+            '\n'.join('{:>4} x {}'.format(times, shape)
+                      for shape, times in stats.shapes.most_common())))
@@ -0,0 +1,184 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import itertools
+import threading
+import time
+from functools import wraps
+
+from flask import g, has_request_context, session as cookie_session
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, orm, text
+
+#----------------------------------------------------------------------------#
+# Read-replica routing.
+#----------------------------------------------------------------------------#
+
+# Views decorated with @read_only run their queries against a replica bind
+# (SQLALCHEMY_BINDS keys starting with 'replica'), picked round-robin among
+# the healthy ones. Everything else -- writes, flushes, CLI commands and
+# any request from a client that wrote within REPLICA_STICKY_SECONDS --
+# stays on the primary, so a form POST's redirect reads its own write.
+#
+# A replica is healthy while its lag, checked every REPLICA_CHECK_INTERVAL
+# seconds, is at most REPLICA_MAX_LAG_SECONDS; between checks it can fall
+# behind by one more interval. The sticky window has to cover both, or a
+# client could be sent back to a replica that has not replayed its write.
+
+
+def read_only(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_only = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+class Replica:
+    def __init__(self, key, engine):
+        self.key = key
+        self.engine = engine
+        # Unknown until the first check; reads use the primary meanwhile.
+        self.healthy = False
+        self.checked_at = 0.0
+
+
+class ReplicaRouter:
+    """Round-robin over replica engines, health/lag checked in the background.
+
+    start() runs the checks on a daemon thread, so pick() never waits on a
+    replica connection.
+    """
+
+    def __init__(self, replicas, check_interval=5, max_lag=10):
+        self.replicas = replicas
+        self.check_interval = check_interval
+        self.max_lag = max_lag
+        self._cycle = itertools.cycle(replicas) if replicas else None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self.replicas and self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name='replica-checks', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self.check_all()
+            time.sleep(self.check_interval)
+
+    def pick(self):
+        for _ in range(len(self.replicas)):
+            with self._lock:
+                replica = next(self._cycle)
+            if replica.healthy:
+                return replica.engine
+        return None
+
+    def check_all(self):
+        for replica in self.replicas:
+            replica.healthy = self.check(replica)
+            replica.checked_at = time.monotonic()
+
+    def check(self, replica):
+        try:
+            with replica.engine.connect() as connection:
+                lag = connection.execute(text(
+                    'SELECT extract(epoch FROM now() - pg_last_xact_replay_timestamp())'
+                )).scalar()
+        except Exception:
+            return False
+        # NULL lag means the server is not replaying WAL (e.g. a primary).
+        return lag is None or lag <= self.max_lag
+
+
+def use_replica():
+    if not has_request_context() or not g.get('read_only'):
+        return False
+    return cookie_session.get('primary_until', 0) <= time.time()
+
+
+class RoutingSession(SignallingSession):
+
+    def get_bind(self, mapper=None, clause=None):
+        if not self._flushing and use_replica():
+            # One replica per request, so its queries share a snapshot.
+            if 'replica_engine' not in g:
+                db = self.app.extensions['sqlalchemy'].db
+                g.replica_engine = db.get_router(self.app).pick()
+            if g.replica_engine is not None:
+                return g.replica_engine
+        return super().get_bind(mapper, clause)
+
+
+def _remember_write():
+    if has_request_context():
+        g.wrote_to_primary = True
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _remember_flush(session, flush_context):
+    _remember_write()
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _remember_bulk_write(orm_execute_state):
+    # Query.update()/delete() and session.execute(update(...)) never flush.
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _remember_write()
+
+
+@event.listens_for(RoutingSession, 'after_begin')
+def _limit_statements(session, transaction, connection):
+    # Per transaction rather than per connection, so the pool's connections
+    # stay unlimited for `flask db upgrade` and the CLI commands.
+    timeout = session.app.config.get('DB_STATEMENT_TIMEOUT_MS')
+    if timeout and has_request_context():
+        connection.exec_driver_sql('SET LOCAL statement_timeout = {:d}'.format(timeout))
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """SQLAlchemy extension whose session routes read-only views to replicas."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._router_lock = threading.Lock()
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def init_app(self, app):
+        super().init_app(app)
+        app.config.setdefault('REPLICA_CHECK_INTERVAL', 5)
+        app.config.setdefault('REPLICA_MAX_LAG_SECONDS', 10)
+        app.config.setdefault('REPLICA_STICKY_SECONDS', (
+            app.config['REPLICA_MAX_LAG_SECONDS'] + app.config['REPLICA_CHECK_INTERVAL']))
+        if app.config['REPLICA_STICKY_SECONDS'] < (
+                app.config['REPLICA_MAX_LAG_SECONDS'] + app.config['REPLICA_CHECK_INTERVAL']):
+            raise RuntimeError(
+                'REPLICA_STICKY_SECONDS must be at least REPLICA_MAX_LAG_SECONDS + '
+                'REPLICA_CHECK_INTERVAL, or clients may not read their own writes.')
+
+        @app.after_request
+        def stick_to_primary(response):
+            if g.get('wrote_to_primary'):
+                cookie_session['primary_until'] = (
+                    time.time() + app.config['REPLICA_STICKY_SECONDS'])
+            return response
+
+    def get_router(self, app):
+        """The app's ReplicaRouter, built from SQLALCHEMY_BINDS on first use."""
+        with self._router_lock:
+            router = app.extensions.get('replica_router')
+            if router is None:
+                keys = sorted(key for key in app.config.get('SQLALCHEMY_BINDS') or {}
+                              if key.startswith('replica'))
+                router = app.extensions['replica_router'] = ReplicaRouter(
+                    [Replica(key, self.get_engine(app, bind=key)) for key in keys],
+                    check_interval=app.config['REPLICA_CHECK_INTERVAL'],
+                    max_lag=app.config['REPLICA_MAX_LAG_SECONDS'],
+                )
+                router.start()
+            return router
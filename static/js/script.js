@@ -2,3 +2,26 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+document.querySelectorAll('[data-autocomplete]').forEach(function (input) {
+  var list = document.getElementById(input.getAttribute('list'));
+  var pending = null;
+  input.addEventListener('input', function () {
+    var term = input.value.trim();
+    if (!term) return;
+    if (pending) pending.abort();
+    pending = new AbortController();
+    fetch('/autocomplete?type=' + input.dataset.autocomplete + '&q=' + encodeURIComponent(term),
+          { signal: pending.signal })
+      .then(function (response) { return response.json(); })
+      .then(function (names) {
+        list.innerHTML = '';
+        names.forEach(function (item) {
+          var option = document.createElement('option');
+          option.value = item.name;
+          list.appendChild(option);
+        });
+      })
+      .catch(function () {});
+  });
+});
@@ -0,0 +1,58 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+# Before the app is imported: the profile is read when it is configured.
+os.environ.setdefault('FYYUR_ENV', 'test')
+
+import counters  # noqa: E402
+from app import app as fyyur_app  # noqa: E402
+from models import Venue, Artist, Show, db  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    """The app on a freshly created TEST_DATABASE_URL schema."""
+    with fyyur_app.app_context():
+        for extension in ('btree_gist', 'pg_trgm'):
+            db.session.execute(db.text('CREATE EXTENSION IF NOT EXISTS {}'.format(extension)))
+        db.session.commit()
+        db.drop_all()
+        db.create_all()
+        yield fyyur_app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture(scope='session')
+def booked(app):
+    """Three venues and three artists with past and upcoming shows each."""
+    venues = [
+        Venue(name='Venue {}'.format(number), city=city, state=state, address='1 Main St',
+              phone='123-123-1234', genres=['Jazz'], seeking_talent=True)
+        for number, (city, state) in enumerate(
+            [('San Francisco', 'CA'), ('San Francisco', 'CA'), ('New York', 'NY')])
+    ]
+    artists = [
+        Artist(name='Artist {}'.format(number), city='San Francisco', state='CA',
+               phone='123-123-1234', genres=['Jazz'], seeking_venue=True)
+        for number in range(3)
+    ]
+    db.session.add_all(venues + artists)
+    db.session.flush()
+
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    for day in range(-30, 30):
+        start_time = now + timedelta(days=day)
+        show = Show(venue_id=venues[day % 3].id, artist_id=artists[day % 3].id,
+                    start_time=start_time, end_time=start_time + timedelta(hours=2))
+        db.session.add(show)
+        counters.show_added(show)
+    db.session.commit()
+    return {"venue_id": venues[0].id, "artist_id": artists[0].id}
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
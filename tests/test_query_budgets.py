@@ -0,0 +1,24 @@
+"""Query budgets of the detail, listing and /shows pages.
+
+Every booked venue and artist has several past and upcoming shows, so a
+per-show or per-venue lookup creeping back in goes over its page's budget.
+"""
+import pytest
+
+from querystats import query_budget
+
+
+@pytest.mark.parametrize('url, budget', [
+    # stamp, entity, upcoming count, past and upcoming shows
+    ('/venues/{venue_id}', 5),
+    ('/artists/{artist_id}', 5),
+    # stamp, genre counts, listing
+    ('/venues', 3),
+    ('/artists', 3),
+    # one keyset page
+    ('/shows', 1),
+])
+def test_page_stays_within_query_budget(client, booked, url, budget):
+    with query_budget(budget):
+        response = client.get(url.format(**booked))
+    assert response.status_code == 200
@@ -0,0 +1,70 @@
+"""The detail and listing queries are served by their composite indexes.
+
+Each query is captured as the app runs it, then EXPLAINed with sequential
+scans disabled: the tables are far too small here for the planner to pick
+an index on its own, but an index that cannot serve the query still loses
+to the (penalised) sequential scan.
+"""
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+import queries
+from models import db
+
+
+@contextmanager
+def captured_statements():
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    engine = db.get_engine()
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+
+
+def _index_names(plan):
+    if 'Index Name' in plan:
+        yield plan['Index Name']
+    for child in plan.get('Plans', ()):
+        yield from _index_names(child)
+
+
+def indexes_used(run):
+    """Indexes in the plans of every statement `run()` executes.
+
+    Indexes of a partition are reported as the index of shows they belong to.
+    """
+    with captured_statements() as statements:
+        run()
+
+    connection = db.session.connection()
+    connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+    indexes = set()
+    for statement, parameters in statements:
+        [plan] = connection.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + statement, parameters).scalar()
+        for name in _index_names(plan['Plan']):
+            indexes.add(connection.execute(
+                db.text('SELECT CAST(coalesce(pg_partition_root(CAST(:name AS regclass)), '
+                        'CAST(:name AS regclass)) AS text)'),
+                {"name": name}).scalar())
+    db.session.rollback()
+    return indexes
+
+
+@pytest.mark.parametrize('detail, key, index', [
+    (queries.venue_detail, 'venue_id', 'ix_shows_venue_id_start_time'),
+    (queries.artist_detail, 'artist_id', 'ix_shows_artist_id_start_time'),
+])
+def test_detail_shows_use_entity_start_time_index(booked, detail, key, index):
+    assert index in indexes_used(lambda: detail(booked[key]))
+
+
+def test_venue_listing_uses_state_city_index(booked):
+    assert 'ix_venues_state_city' in indexes_used(queries.venue_areas)